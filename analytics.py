@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+analytics.py - Daily climate metrics computed with NumPy over the sensor history
+Closed days are computed once and cached in the daily_summary table; only today's
+partial day is recomputed on each request.
+
+Usage:
+  python analytics.py                                        # cache every closed day not cached yet
+  python analytics.py --start 2024-01-01 --end 2024-12-31   # fill the cache for a range
+"""
+
+import argparse
+import sys
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from sqlalchemy import func, select
+
+from archive import archived_months, load_sensor_columns
+from compression import reconstruct, RECONSTRUCT_STEP
+from config import (COMPRESSION_MAX_INTERVAL, TARGET_TEMP_F, TARGET_HUMIDITY, HUMIDITY_RANGE,
+                    get_accurate_time)
+from models import db, DailySummary, SensorData
+from spool import oldest_unreplayed
+
+METRICS = ['readings', 'covered_hours', 'avg_temp_f', 'min_temp_f', 'max_temp_f', 'avg_humidity',
+           'avg_vpd_kpa', 'max_vpd_kpa', 'degree_hours', 'humidity_low_hours', 'humidity_high_hours',
+           'fan_duty_cycle', 'avg_fan_signal', 'hydrometer_a_drying_rate', 'hydrometer_b_drying_rate']
+MAX_SAMPLE_SECONDS = COMPRESSION_MAX_INTERVAL + RECONSTRUCT_STEP  # Longer gaps are outages, not data
+CHUNK_DAYS = 31  # Days of readings loaded at once while filling the cache
+
+
+def vapor_pressure_deficit(temp_f, humidity):
+    """VPD in kPa from air temperature (°F) and relative humidity (%), Tetens formula."""
+    temp_c = (temp_f - 32) * 5 / 9
+    saturation = 0.6108 * np.exp(17.27 * temp_c / (temp_c + 237.3))
+    return saturation * (1 - humidity / 100)
+
+
+def _weighted_mean(values, weights, day, n_days):
+    valid = np.isfinite(values)
+    totals = np.bincount(day, weights=np.where(valid, values * weights, 0), minlength=n_days)
+    duration = np.bincount(day, weights=np.where(valid, weights, 0), minlength=n_days)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(duration > 0, totals / duration, np.nan)
+
+
+def _drying_rate(values, hour, hours_per_day, n_days):
+    """Mean fall in % per hour between consecutive hourly means, skipping hours where it rose (watering)."""
+    n_hours = n_days * hours_per_day
+    valid = np.isfinite(values)
+    sums = np.bincount(hour[valid], weights=values[valid], minlength=n_hours)
+    counts = np.bincount(hour[valid], minlength=n_hours)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hourly = np.where(counts > 0, sums / counts, np.nan)
+    change = np.diff(hourly)  # change[i]: from hour i to hour i + 1
+    drying = np.isfinite(change) & (change <= 0)
+    change_day = np.arange(1, n_hours) // hours_per_day
+    total = np.bincount(change_day[drying], weights=-change[drying], minlength=n_days)
+    count = np.bincount(change_day[drying], minlength=n_days)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def compute_days(first_day, n_days, until=None):
+    """Metrics for n_days consecutive days from first_day as a list of dicts. Must run in an app context.
+
+    All days come from one load of the sensor columns; every metric is a bincount over day (or hour)
+    indexes, weighted by how long each sample was current.
+    """
+    start = datetime.combine(first_day, time.min)
+    end = start + timedelta(days=n_days) - timedelta(microseconds=1)
+    if until is not None:
+        end = min(end, until)
+    columns = reconstruct(load_sensor_columns(start, end), until=end)
+    offset_s = (columns['timestamp'] - np.datetime64(start, 'us')) / np.timedelta64(1, 's')
+    day = (offset_s // 86400).astype(np.int64)
+    hour = (offset_s // 3600).astype(np.int64)
+    # Each sample holds until the next one; gaps longer than that are outages and do not count as time
+    gaps = np.diff(offset_s, append=offset_s[-1] if len(offset_s) else 0)
+    hours = np.where(gaps <= MAX_SAMPLE_SECONDS, gaps, 0) / 3600
+
+    temp, humidity, fan = columns['temp_f'], columns['humidity'], columns['fan_signal']
+    vpd = vapor_pressure_deficit(temp, humidity)
+    covered = np.bincount(day, weights=hours, minlength=n_days)
+    metrics = {
+        'readings': np.bincount(day, minlength=n_days),
+        'covered_hours': covered,
+        'avg_temp_f': _weighted_mean(temp, hours, day, n_days),
+        'avg_humidity': _weighted_mean(humidity, hours, day, n_days),
+        'avg_vpd_kpa': _weighted_mean(vpd, hours, day, n_days),
+        'degree_hours': np.bincount(day, weights=np.nan_to_num(np.maximum(temp - TARGET_TEMP_F, 0)) * hours,
+                                    minlength=n_days),
+        'humidity_low_hours': np.bincount(day, weights=(humidity < TARGET_HUMIDITY - HUMIDITY_RANGE) * hours,
+                                          minlength=n_days),
+        'humidity_high_hours': np.bincount(day, weights=(humidity > TARGET_HUMIDITY + HUMIDITY_RANGE) * hours,
+                                           minlength=n_days),
+        'fan_duty_cycle': _weighted_mean((fan > 0).astype(np.float64), hours, day, n_days),
+        'avg_fan_signal': _weighted_mean(fan, hours, day, n_days),
+        'hydrometer_a_drying_rate': _drying_rate(columns['hydrometer_a'], hour, 24, n_days),
+        'hydrometer_b_drying_rate': _drying_rate(columns['hydrometer_b'], hour, 24, n_days),
+    }
+    for name, values, reduce in (('min_temp_f', temp, np.fmin), ('max_temp_f', temp, np.fmax),
+                                 ('max_vpd_kpa', vpd, np.fmax)):
+        result = np.full(n_days, np.nan)
+        if len(day):
+            # Samples are in time order, so each day is one contiguous run
+            starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+            result[day[starts]] = reduce.reduceat(values, starts)
+        metrics[name] = result
+
+    days = []
+    for i in range(n_days):
+        row = {'date': first_day + timedelta(days=i)}
+        for name in METRICS:
+            value = metrics[name][i].item()
+            if name != 'readings':
+                # bincount of an empty day is an integer 0
+                value = float(value)
+            row[name] = None if isinstance(value, float) and not np.isfinite(value) else value
+        days.append(row)
+    return days
+
+
+def _as_json(row):
+    result = {name: round(value, 3) if isinstance(value, float) else value for name, value in row.items()}
+    result['date'] = row['date'].isoformat()
+    return result
+
+
+def daily_summaries(first_day, last_day, refresh=False, store=True):
+    """Metrics for every day in [first_day, last_day]. Must run in an app context.
+
+    Closed days are read from (or, with store=True, added to) the daily_summary table; today, and any
+    day with rows still waiting in the reading journal, is always recomputed and never stored.
+    refresh=True recomputes cached days too.
+    """
+    now = get_accurate_time()
+    today = now.date()
+    last_day = min(last_day, today)
+    cached = {}
+    if not refresh:
+        rows = DailySummary.query.filter(DailySummary.date >= first_day, DailySummary.date <= last_day).all()
+        cached = {row.date: {'date': row.date, **{name: getattr(row, name) for name in METRICS}} for row in rows}
+    n_days = (last_day - first_day).days + 1
+    missing = [first_day + timedelta(days=i) for i in range(n_days)
+               if first_day + timedelta(days=i) not in cached]
+    computed = []
+    # Group missing days into runs of consecutive days, each loaded in at most CHUNK_DAYS pieces
+    runs = []
+    for day in missing:
+        if runs and (day - runs[-1][0]).days == runs[-1][1] and runs[-1][1] < CHUNK_DAYS:
+            runs[-1][1] += 1
+        else:
+            runs.append([day, 1])
+    for run_start, run_days in runs:
+        computed.extend(compute_days(run_start, run_days, until=now))
+
+    # A day is only complete once the journal has replayed everything up to its end
+    pending = oldest_unreplayed()
+    complete_before = min(today, pending.date()) if pending else today
+    new_rows = [row for row in computed if row['date'] < complete_before]
+    if new_rows and store:
+        if refresh:
+            DailySummary.query.filter(DailySummary.date.in_([row['date'] for row in new_rows])) \
+                .delete(synchronize_session=False)
+        db.session.add_all([DailySummary(**row) for row in new_rows])
+        try:
+            db.session.commit()
+        except Exception as e:
+            # The cache is an optimisation; another process may have stored the same days
+            db.session.rollback()
+            print(f'[Analytics] Could not cache daily summaries: {e}')
+    for row in computed:
+        cached[row['date']] = row
+    return [_as_json(cached[day]) for day in sorted(cached)]
+
+
+def first_reading_day():
+    """Day of the oldest reading, archived or still in SQLite, or None. Must run in an app context."""
+    months = archived_months()
+    if months:
+        return date.fromisoformat(months[0]['days'][0])
+    oldest = db.session.execute(select(func.min(SensorData.timestamp))).scalar()
+    return oldest.date() if oldest else None
+
+
+def fill_cache():
+    """Cache every closed day since the oldest reading that is not cached yet. Must run in an app context.
+
+    The first run backfills the whole history (archived months included); later runs only compute
+    the days closed since. Returns the number of days in the range.
+    """
+    first_day = first_reading_day()
+    if first_day is None:
+        return 0
+    last_day = get_accurate_time().date() - timedelta(days=1)
+    if first_day > last_day:
+        return 0
+    return len(daily_summaries(first_day, last_day))
+
+
+def summarize(days):
+    """Totals over a list of daily rows, weighting averages by each day's covered hours."""
+    covered = sum((day['covered_hours'] or 0.0 for day in days), 0.0)
+    totals = {
+        'days': len(days),
+        'readings': sum(day['readings'] or 0 for day in days),
+        'covered_hours': round(covered, 3),
+        'min_temp_f': min((day['min_temp_f'] for day in days if day['min_temp_f'] is not None), default=None),
+        'max_temp_f': max((day['max_temp_f'] for day in days if day['max_temp_f'] is not None), default=None),
+        'max_vpd_kpa': max((day['max_vpd_kpa'] for day in days if day['max_vpd_kpa'] is not None), default=None),
+    }
+    for name in ('degree_hours', 'humidity_low_hours', 'humidity_high_hours'):
+        totals[name] = round(sum((day[name] or 0.0 for day in days), 0.0), 3)
+    for name in ('avg_temp_f', 'avg_humidity', 'avg_vpd_kpa', 'fan_duty_cycle', 'avg_fan_signal'):
+        weighted = [(day[name], day['covered_hours']) for day in days if day[name] is not None]
+        weight = sum(hours for _, hours in weighted)
+        totals[name] = round(sum(value * hours for value, hours in weighted) / weight, 3) if weight else None
+    for name in ('hydrometer_a_drying_rate', 'hydrometer_b_drying_rate'):
+        rates = [day[name] for day in days if day[name] is not None]
+        totals[name] = round(sum(rates) / len(rates), 3) if rates else None
+    return totals
+
+
+def main():
+    from flask import Flask
+    from config import DATABASE_URI
+
+    parser = argparse.ArgumentParser(description='Compute and cache daily climate analytics')
+    parser.add_argument('--start', help='First day (YYYY-MM-DD, default: every closed day not cached yet)')
+    parser.add_argument('--end', help='Last day (YYYY-MM-DD, default today)')
+    parser.add_argument('--refresh', action='store_true', help='Recompute days already cached')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        if not args.start:
+            print(f'[Analytics] {fill_cache()} closed days cached')
+            return 0
+        first_day = date.fromisoformat(args.start)
+        last_day = date.fromisoformat(args.end) if args.end else get_accurate_time().date()
+        days = daily_summaries(first_day, last_day, refresh=args.refresh)
+    print(summarize(days))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,54 @@
-﻿from flask import Flask, render_template, request, jsonify, send_file
+﻿import time
+_startup_clock = time.perf_counter()
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 import serial
 import threading
-import time
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import math
 from dateutil.relativedelta import relativedelta
 from models import db, SensorData, TriggerLog, WateringSchedule, WateringLog
-from config import get_accurate_time, TARGET_TEMP_F, TARGET_HUMIDITY, TEMP_RANGE, HUMIDITY_RANGE
+from config import get_accurate_time, sync_ntp_offset, NTP_SYNC_INTERVAL, HISTORY_IMMUTABLE_AFTER, HISTORY_DELTA_MAX_MINUTES, TARGET_TEMP_F, TARGET_HUMIDITY, TEMP_RANGE, HUMIDITY_RANGE, MIN_WATER_TEMP, IMAGE_MAINTENANCE_INTERVAL, JOURNAL_REPLAY_INTERVAL, JOURNAL_BACKLOG_WARN
+from profiling import init_profiling, arm_capture
+from export import generate_export, export_filename, parse_timestamp, EXPORT_FORMATS
+from archive import load_sensor_columns, archive_closed_months, archived_months, archive_size, SENSOR_FIELDS
+from ipc import call as daemon_call, DaemonUnavailable
+from responses import cached_json
+from delta import fetch_delta
+from scheduler import WateringScheduler
+from compression import ReadingCompressor, reconstruct
+from analytics import daily_summaries, fill_cache, summarize
+from images import run_maintenance, image_stats, list_images, load_index, resolve_image, mimetype
+from livestream import LiveStream, BOUNDARY
+from spool import ReadingJournal, replay, oldest_unreplayed
+from dashboard import SnapshotCache
 import argparse
 import os
 import atexit
-import cv2
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+# Process role: 'dev' (python app.py, everything in one process), 'daemon' (daemon.py owns the serial
+# port, camera and schedulers) or 'web' (wsgi.py, HTTP API that forwards hardware commands to the daemon)
+ROLE = os.environ.get('AUTO_FARM_ROLE', 'dev')
+
+# Milliseconds spent in each startup phase, measured from the first line of this module
+STARTUP_TIMINGS = {}
+_last_startup_mark = _startup_clock
+
+def mark_startup_phase(phase):
+    global _last_startup_mark
+    now = time.perf_counter()
+    STARTUP_TIMINGS[phase] = round((now - _last_startup_mark) * 1000, 1)
+    _last_startup_mark = now
+
+def log_startup_timings():
+    phases = ', '.join(f"{phase}={ms}ms" for phase, ms in STARTUP_TIMINGS.items())
+    print(f"[Startup] {phases} (total {sum(STARTUP_TIMINGS.values()):.1f}ms)")
+
 # Serial setup
 SERIAL_PORT = 'COM5'  # Default, can be overridden with --port argument
 BAUD_RATE = 9600
@@ -28,20 +59,45 @@ if not os.path.exists(CAMERA_FOLDER):
     os.makedirs(CAMERA_FOLDER)
 CAMERA_INDEX = 0  # Default, can be overridden with --camera-index argument
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(description='auto-farm - Automated Greenhouse Control System')
-parser.add_argument('--port', '-p', type=str, help='Arduino COM port (e.g., COM3, /dev/ttyUSB0)')
-parser.add_argument('--camera-index', '-c', type=int, help='Webcam camera index (default: 0, use find_webcam.py to list available cameras)')
-args, unknown = parser.parse_known_args()
-
-if args.port:
-    SERIAL_PORT = args.port
-    print(f"Using COM port: {SERIAL_PORT}")
-if args.camera_index is not None:
-    CAMERA_INDEX = args.camera_index
-    print(f"Using camera index: {CAMERA_INDEX}")
+def configure_from_args(argv=None):
+    """Parse command line arguments and apply them. Called by the entry points, not at import."""
+    global SERIAL_PORT, CAMERA_INDEX
+    parser = argparse.ArgumentParser(description='auto-farm - Automated Greenhouse Control System')
+    parser.add_argument('--port', '-p', type=str, help='Arduino COM port (e.g., COM3, /dev/ttyUSB0)')
+    parser.add_argument('--camera-index', '-c', type=int, help='Webcam camera index (default: 0, use find_webcam.py to list available cameras)')
+    parser.add_argument('--profile', action='store_true', help='Log per-request timing by phase and slow SQL queries')
+    parser.add_argument('--profile-route', type=str, help='Capture cProfile stats for requests to this route (e.g. /api/history), implies --profile')
+    parser.add_argument('--profile-count', type=int, default=1, help='Number of requests to capture with --profile-route (default: 1)')
+    args, unknown = parser.parse_known_args(argv)
+
+    if args.port:
+        SERIAL_PORT = args.port
+        print(f"Using COM port: {SERIAL_PORT}")
+    if args.camera_index is not None:
+        CAMERA_INDEX = args.camera_index
+        print(f"Using camera index: {CAMERA_INDEX}")
+    if args.profile or args.profile_route:
+        init_profiling(app)
+        if args.profile_route:
+            arm_capture(args.profile_route, args.profile_count)
+    return args
+
 ser = None
-_watering_lock = threading.Lock()
+_watering_locks = {}  # zone id -> Lock; each zone runs at most one cycle at a time
+_watering_locks_guard = threading.Lock()
+shutdown_event = threading.Event()
+_background_threads = {}
+last_reading_at = None
+compressor = ReadingCompressor()
+journal = ReadingJournal()  # Opened by start_background_tasks(); only the ingest process writes it
+_trigger_states = {}  # trigger name -> state last journaled; seeded by load_trigger_states()
+# In the web tier the webcam belongs to the ingest daemon, so live frames are fetched from it
+live_stream = LiveStream(lambda: CAMERA_INDEX, shutdown_event,
+                         remote=(lambda after: daemon_call('live_frame', after=after)) if ROLE == 'web' else None)
+
+def _zone_lock(zone_id):
+    with _watering_locks_guard:
+        return _watering_locks.setdefault(zone_id, threading.Lock())
 
 def init_serial():
     global ser
@@ -68,8 +124,9 @@ def close_serial():
         print("Serial connection closed.")
 
 def read_serial():
+    global last_reading_at
     last_fan_speed = None
-    while True:
+    while not shutdown_event.is_set():
         if ser and ser.is_open:
             try:
                 line = ser.readline().decode('utf-8').strip()
@@ -100,20 +157,45 @@ def read_serial():
                             print("[Serial] temp=0 humidity=0, sensor not ready, skipping")
                             continue
                         timestamp = get_accurate_time()
-                        data = SensorData(timestamp=timestamp, temp_f=temp_f, fan_signal=fan_signal,
-                                        hydrometer_a=hydrometer_a, hydrometer_b=hydrometer_b, humidity=humidity)
-                        with app.app_context():
-                            db.session.add(data)
-                            db.session.commit()
-                            # Re-evaluate triggers and apply commands if state changed
-                            current_triggers = calculate_and_log_triggers()
-                            fan_speed = calculate_fan_speed()
-                            if fan_speed != last_fan_speed:
-                                send_command(f"F:{fan_speed}")
-                                last_fan_speed = fan_speed
+                        reading = dict(timestamp=timestamp, temp_f=temp_f, fan_signal=fan_signal,
+                                       hydrometer_a=hydrometer_a, hydrometer_b=hydrometer_b, humidity=humidity)
+                        # With compression enabled most readings are not stored. Stored ones go to the
+                        # journal, never straight to SQLite, so a busy database cannot stall or lose them
+                        journal.append(compressor.offer(reading))
+                        last_reading_at = timestamp
+                        current = SensorData(**reading)
+                        fan_speed = calculate_fan_speed(current)
+                        if fan_speed != last_fan_speed:
+                            send_command(f"F:{fan_speed}")
+                            last_fan_speed = fan_speed
+                        zone_scheduler.notify_reading({'temp_f': temp_f, 'hydrometer_a': hydrometer_a,
+                                                       'hydrometer_b': hydrometer_b})
+                        # Re-evaluate triggers; their states are journaled too
+                        current_triggers = calculate_and_log_triggers(current)
             except Exception as e:
                 print(f"Error reading serial: {e}")
         time.sleep(0.1)
+    journal.append(compressor.flush())
+
+def journal_replayer():
+    """Background thread: move journaled readings into SQLite in batches, retrying while the database is unavailable."""
+    failing = False
+    while True:
+        stopping = shutdown_event.is_set()
+        try:
+            journal.sync()
+            with app.app_context():
+                replay(journal)
+            if failing:
+                print('[Journal] Database writable again, backlog replayed')
+            failing = False
+        except Exception as e:
+            if not failing:
+                print(f'[Journal] Replay failed, readings stay in the journal: {e}')
+            failing = True
+        if stopping:
+            break
+        shutdown_event.wait(JOURNAL_REPLAY_INTERVAL * (5 if failing else 1))
 
 
 @app.route('/')
@@ -154,17 +236,29 @@ def get_time():
 
 @app.route('/api/data')
 def get_data():
-    latest = SensorData.query.order_by(SensorData.timestamp.desc()).first()
-    if latest:
-        return jsonify({
-            'timestamp': latest.timestamp.isoformat(),
-            'temp_f': latest.temp_f,
-            'fan_signal': latest.fan_signal,
-            'hydrometer_a': latest.hydrometer_a,
-            'hydrometer_b': latest.hydrometer_b,
-            'humidity': latest.humidity
-        })
-    return jsonify({})
+    """Latest reading, or with since=<cursor|timestamp> everything newer (see delta.fetch_delta)."""
+    since = request.args.get('since')
+    if since:
+        try:
+            payload = fetch_delta(since)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid since: {e}'}), 400
+        # With compression the stored rows lag behind; 'latest' is the newest reading received
+        payload['latest'] = dashboard.get('data')
+        return jsonify(payload)
+    return jsonify(dashboard.get('data'))
+
+def _reading_json(reading):
+    if not reading:
+        return {}
+    return {
+        'timestamp': reading.timestamp.isoformat(),
+        'temp_f': reading.temp_f,
+        'fan_signal': reading.fan_signal,
+        'hydrometer_a': reading.hydrometer_a,
+        'hydrometer_b': reading.hydrometer_b,
+        'humidity': reading.humidity
+    }
 
 
 @app.route('/api/control', methods=['POST'])
@@ -190,20 +284,33 @@ def control():
 def control_reset():
     """Re-apply device states based on current trigger calculations (same logic as app startup)."""
     try:
-        current_triggers = calculate_and_log_triggers()
-        fan_speed = calculate_fan_speed()
-        send_command(f"F:{fan_speed}")
-        send_command("W0")
-        return jsonify({
-            'status': 'ok',
-            'fan_speed': fan_speed,
-            'triggers': [{'name': t['name'], 'active': t['active']} for t in current_triggers]
-        })
+        result = daemon_call('reset') if ROLE == 'web' else apply_device_states()
+        return jsonify({'status': 'ok', **result})
+    except DaemonUnavailable:
+        raise
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+def apply_device_states():
+    """Send fan speed from current triggers and close the valve. Must be called inside an app context."""
+    # Trigger states are only logged by read_serial, from live readings
+    latest = latest_reading()
+    current_triggers = evaluate_triggers(latest)
+    fan_speed = calculate_fan_speed(latest)
+    send_command(f"F:{fan_speed}")
+    send_command("W0")  # Valve defaults closed; control separately
+    return {
+        'fan_speed': fan_speed,
+        'triggers': [{'name': t['name'], 'active': t['active']} for t in current_triggers]
+    }
+
+
 def send_command(cmd):
+    if ROLE == 'web':
+        # The serial port belongs to the ingest daemon
+        daemon_call('command', command=cmd)
+        return
     if ser and ser.is_open:
         ser.write((cmd + '\n').encode())
 
@@ -221,73 +328,128 @@ def _save_watering_image(label, triggered_by):
         print(f'[Watering] Could not save {label} image: {e}')
 
 
-def run_watering_cycle(duration_seconds, triggered_by='schedule'):
-    """Open the valve for duration_seconds then guarantee it is closed. Thread-safe."""
-    if not _watering_lock.acquire(blocking=False):
-        print('[Watering] Cycle already in progress, skipping.')
+def run_watering_cycle(duration_seconds, triggered_by='schedule', zone_id=1):
+    """Open a zone's valve for duration_seconds then guarantee it is closed. Thread-safe per zone."""
+    if shutdown_event.is_set():
         return False
+    lock = _zone_lock(zone_id)
+    if not lock.acquire(blocking=False):
+        print(f'[Watering] Zone {zone_id} cycle already in progress, skipping.')
+        return False
+    close_command = 'W0'
     try:
-        print(f'[Watering] Opening valve for {duration_seconds}s (triggered by: {triggered_by})')
-        # Capture before image
         with app.app_context():
+            zone = db.session.get(WateringSchedule, zone_id)
+            if zone is None:
+                print(f'[Watering] Unknown zone {zone_id}, skipping.')
+                return False
+            name, open_command, close_command = zone.name, zone.open_command, zone.close_command
+            print(f'[Watering] {name}: opening valve for {duration_seconds}s (triggered by: {triggered_by})')
+            # Capture before image
             _save_watering_image('before', triggered_by)
-        send_command('W1')
+        send_command(open_command)
         time.sleep(duration_seconds)
-        # Send W0 twice with a short gap to guarantee the valve closes
-        send_command('W0')
+        # Send the close command twice with a short gap to guarantee the valve closes
+        send_command(close_command)
         time.sleep(0.2)
-        send_command('W0')
-        print('[Watering] Valve closed.')
+        send_command(close_command)
+        print(f'[Watering] {name}: valve closed.')
         with app.app_context():
             # Capture after image
             _save_watering_image('after', triggered_by)
             log = WateringLog(
                 timestamp=get_accurate_time(),
                 duration_seconds=duration_seconds,
-                triggered_by=triggered_by
+                triggered_by=triggered_by,
+                zone_id=zone_id
             )
             db.session.add(log)
-            schedule = WateringSchedule.query.first()
-            if schedule:
-                schedule.last_watered = get_accurate_time()
+            zone = db.session.get(WateringSchedule, zone_id)
+            if zone:
+                zone.last_watered = get_accurate_time()
             db.session.commit()
         return True
     except Exception as e:
         print(f'[Watering] Error during cycle: {e}')
-        send_command('W0')  # Safety close on error
+        send_command(close_command)  # Safety close on error
         return False
     finally:
-        _watering_lock.release()
+        lock.release()
+        # The zone's next timed watering depends on last_watered
+        zone_scheduler.wake()
+        dashboard.invalidate('watering')
+
+
+def load_watering_zones():
+    """Zone configs as plain dicts, usable by the scheduler outside an app context."""
+    with app.app_context():
+        return [{
+            'id': z.id,
+            'name': z.name,
+            'enabled': z.enabled,
+            'duration_seconds': z.duration_seconds,
+            'interval_hours': z.interval_hours,
+            'last_watered': z.last_watered,
+            'close_command': z.close_command,
+            'moisture_sensor': z.moisture_sensor,
+            'moisture_threshold': z.moisture_threshold,
+            'moisture_cooldown_minutes': z.moisture_cooldown_minutes,
+            'min_temp_f': MIN_WATER_TEMP
+        } for z in WateringSchedule.query.order_by(WateringSchedule.id).all()]
+
+
+zone_scheduler = WateringScheduler(
+    load_zones=load_watering_zones,
+    run_cycle=lambda zone, triggered_by: run_watering_cycle(zone['duration_seconds'], triggered_by, zone['id']),
+    is_busy=lambda zone_id: _zone_lock(zone_id).locked(),
+    clock=get_accurate_time
+)
 
 
 def watering_scheduler():
-    """Background thread: checks every 60 s whether it is time to water."""
-    time.sleep(30)  # Brief startup delay so serial has time to init
-    while True:
+    """Background thread: sleeps until the next zone is due; woken early by schedule changes."""
+    zone_scheduler.run(shutdown_event)
+
+def archive_scheduler():
+    """Background thread: once a day, move closed months of sensor data into the columnar archive and
+    cache analytics for every closed day not cached yet (the whole history on the first run)."""
+    shutdown_event.wait(60)  # Let startup settle before touching the database
+    while not shutdown_event.is_set():
         try:
             with app.app_context():
-                schedule = WateringSchedule.query.first()
-                if schedule and schedule.enabled:
-                    now = get_accurate_time()
-                    interval_td = timedelta(hours=schedule.interval_hours)
-                    if schedule.last_watered is None or (now - schedule.last_watered) >= interval_td:
-                        run_watering_cycle(schedule.duration_seconds, triggered_by='schedule')
+                archive_closed_months()
+        except Exception as e:
+            print(f'[Archive] Error: {e}')
+        try:
+            with app.app_context():
+                fill_cache()
+        except Exception as e:
+            print(f'[Analytics] Error: {e}')
+        shutdown_event.wait(24 * 3600)
+
+def image_maintenance_scheduler():
+    """Background thread: dedup, re-encode and cap camera_images/ every IMAGE_MAINTENANCE_INTERVAL seconds."""
+    shutdown_event.wait(120)  # Let startup captures finish first
+    while not shutdown_event.is_set():
+        try:
+            stats = run_maintenance(CAMERA_FOLDER)
+            print(f"[Images] {stats['image_count']} images, {stats['image_size'] // 1024} KB")
         except Exception as e:
-            print(f'[Watering Scheduler] Error: {e}')
-        time.sleep(60)  # Check once per minute
+            print(f'[Images] Error: {e}')
+        shutdown_event.wait(IMAGE_MAINTENANCE_INTERVAL)
 
-def capture_and_overlay_image(trigger_event=None, trigger_name=None):
-    """Capture image from webcam and overlay sensor stats. Optionally overlay trigger event info."""
+def capture_and_overlay_image(trigger_event=None, trigger_name=None, latest_data=None):
+    """Capture image from webcam and overlay sensor stats (default: latest stored). Optionally overlay trigger event info."""
     try:
+        # Imaging libraries are slow to import, so load them on the first capture instead of at startup
+        import cv2
+        from PIL import Image, ImageDraw, ImageFont
         # Get latest sensor data
-        latest_data = SensorData.query.order_by(SensorData.timestamp.desc()).first()
-        # Try to capture from webcam
-        cap = cv2.VideoCapture(CAMERA_INDEX)
-        if not cap.isOpened():
-            return None
-        ret, frame = cap.read()
-        cap.release()
-        if not ret:
+        if latest_data is None:
+            latest_data = SensorData.query.order_by(SensorData.timestamp.desc()).first()
+        # Capture from webcam (shared with the live view while it is running)
+        frame = live_stream.capture_still()
+        if frame is None:
             return None
         # Convert BGR to RGB for PIL
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -348,56 +510,81 @@ def capture_camera():
         trigger_event = data.get('trigger_event')
         trigger_name = data.get('trigger_name')
         
-        result = capture_and_overlay_image(trigger_event=trigger_event, trigger_name=trigger_name)
-        if result is None:
+        if ROLE == 'web':
+            saved = daemon_call('capture', timeout=30, trigger_event=trigger_event, trigger_name=trigger_name)
+        else:
+            saved = save_camera_capture(trigger_event, trigger_name)
+        if saved is None:
             return jsonify({'error': 'Could not capture image from webcam'}), 400
-
-        img, timestamp = result
-
-        # Save image
-        label_part = ""
-        if trigger_name or trigger_event:
-            name_str = trigger_name.replace(' ', '_') if trigger_name else ''
-            event_str = trigger_event.replace(' ', '_') if trigger_event else ''
-            label_part = f"_{name_str}_{event_str}".strip('_')
-            if label_part:
-                label_part = f"_{label_part}"
-        filename = timestamp.strftime("%Y%m%d_%H%M%S") + f"{label_part}.jpg"
-        filepath = os.path.join(CAMERA_FOLDER, filename)
-        img.save(filepath)
-        
-        return jsonify({
-            'status': 'ok',
-            'filename': filename,
-            'timestamp': timestamp.isoformat(),
-            'path': filepath
-        })
+        return jsonify({'status': 'ok', **saved})
+    except DaemonUnavailable:
+        raise
     except Exception as e:
         print(f"Error in capture_camera: {e}")
         return jsonify({'error': str(e)}), 500
 
+def save_camera_capture(trigger_event=None, trigger_name=None):
+    """Capture an overlaid image and save it to disk. Returns file info, or None if the webcam failed."""
+    result = capture_and_overlay_image(trigger_event=trigger_event, trigger_name=trigger_name)
+    if result is None:
+        return None
+
+    img, timestamp = result
+
+    # Save image
+    label_part = ""
+    if trigger_name or trigger_event:
+        name_str = trigger_name.replace(' ', '_') if trigger_name else ''
+        event_str = trigger_event.replace(' ', '_') if trigger_event else ''
+        label_part = f"_{name_str}_{event_str}".strip('_')
+        if label_part:
+            label_part = f"_{label_part}"
+    filename = timestamp.strftime("%Y%m%d_%H%M%S") + f"{label_part}.jpg"
+    filepath = os.path.join(CAMERA_FOLDER, filename)
+    img.save(filepath)
+    
+    return {
+        'filename': filename,
+        'timestamp': timestamp.isoformat(),
+        'path': filepath
+    }
+
+@app.route('/camera/live')
+def camera_live():
+    """Live MJPEG stream of the webcam; fps=<n> lowers the frame rate for this viewer."""
+    fps = request.args.get('fps', type=float)
+    response = Response(live_stream.frames(fps if fps and fps > 0 else None),
+                        mimetype=f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+    response.headers['Cache-Control'] = 'no-cache, no-store'
+    return response
+
 @app.route('/api/camera/latest')
 def get_latest_image():
     """Get info about the latest captured image"""
     try:
-        files = sorted([f for f in os.listdir(CAMERA_FOLDER) if f.endswith('.jpg')], reverse=True)
-        if not files:
+        latest = latest_image_info()
+        if not latest:
             return jsonify({'error': 'No images found'}), 404
-        
-        latest_file = files[0]
-        filepath = os.path.join(CAMERA_FOLDER, latest_file)
-        file_stat = os.stat(filepath)
-        
-        return jsonify({
-            'filename': latest_file,
-            'timestamp': datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
-            'size': file_stat.st_size
-        })
+        return jsonify(latest)
     except Exception as e:
         print(f"Error in get_latest_image: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+def latest_image_info():
+    """Filename, time and size of the newest captured image, or None."""
+    files = list_images(CAMERA_FOLDER)
+    if not files:
+        return None
+    latest_file = files[-1]
+    file_stat = os.stat(os.path.join(CAMERA_FOLDER, latest_file))
+    return {
+        'filename': latest_file,
+        'timestamp': datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
+        'size': file_stat.st_size
+    }
+
+
 @app.route('/api/camera/images')
 def get_camera_images():
     """Get list of captured images with pagination (limit, offset)"""
@@ -405,15 +592,18 @@ def get_camera_images():
         limit = request.args.get('limit', default=10, type=int)
         offset = request.args.get('offset', default=0, type=int)
         images = []
-        files = sorted([f for f in os.listdir(CAMERA_FOLDER) if f.endswith('.jpg')], reverse=True)
+        files = list_images(CAMERA_FOLDER)[::-1]
         paged_files = files[offset:offset+limit]
+        duplicates = load_index(CAMERA_FOLDER)['duplicates']
         for filename in paged_files:
             filepath = os.path.join(CAMERA_FOLDER, filename)
             file_stat = os.stat(filepath)
             images.append({
                 'filename': filename,
                 'timestamp': datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
-                'size': file_stat.st_size
+                'size': file_stat.st_size,
+                # Near-identical frames removed by image maintenance, e.g. repeated trigger captures
+                'duplicates': duplicates.get(filename, [])
             })
         return jsonify({'images': images, 'total': len(files)})
     except Exception as e:
@@ -428,19 +618,43 @@ def serve_image(filename):
         if '..' in filename or '/' in filename or '\\' in filename:
             return jsonify({'error': 'Invalid filename'}), 400
         
-        filepath = os.path.join(CAMERA_FOLDER, filename)
-        if not os.path.exists(filepath):
+        # Falls back to the re-encoded copy or the kept frame of a removed duplicate
+        stored = resolve_image(CAMERA_FOLDER, filename)
+        if stored is None:
             return jsonify({'error': 'Image not found'}), 404
         
-        return send_file(filepath, mimetype='image/jpeg')
+        return send_file(os.path.join(CAMERA_FOLDER, stored), mimetype=mimetype(stored))
     except Exception as e:
         print(f"Error serving image: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/history')
 def get_history():
+    """Per-minute sensor averages and trigger states for a range.
+
+    format=columnar returns a compact layout: the first minute, a step in seconds, one array per
+    field (null for minutes without data) and each trigger as a list of [minute_index, active]
+    transitions. Either format supports gzip/brotli and ETag revalidation; ranges that ended more
+    than HISTORY_IMMUTABLE_AFTER seconds ago are marked immutable.
+
+    since=<timestamp> replaces start and returns at most HISTORY_DELTA_MAX_MINUTES minutes, plus
+    'next_since' and 'more' so a client can catch up in batches and then poll for new minutes.
+    """
     start = request.args.get('start')
     end = request.args.get('end')
+    since = request.args.get('since')
+    columnar = request.args.get('format') == 'columnar'
+    if since:
+        # Delta mode: minutes from the client's last (possibly partial) minute onwards, in bounded batches
+        try:
+            start_dt = parse_timestamp(since).replace(second=0, microsecond=0)
+            end_dt = parse_timestamp(end) if end else get_accurate_time()
+        except ValueError as e:
+            return jsonify({'error': f'Invalid since/end: {e}'}), 400
+        start = start_dt.isoformat()
+        batch_end = start_dt + timedelta(minutes=HISTORY_DELTA_MAX_MINUTES) - timedelta(microseconds=1)
+        more = end_dt > batch_end
+        end = min(end_dt, batch_end).isoformat()
     if start and end:
         try:
             # Remove 'Z' suffix if present (from JavaScript ISO format)
@@ -450,80 +664,157 @@ def get_history():
             start_dt = datetime.fromisoformat(start)
             end_dt = datetime.fromisoformat(end)
             
-            # Get sensor data
-            sensor_data = SensorData.query.filter(
-                SensorData.timestamp >= start_dt, 
-                SensorData.timestamp <= end_dt
-            ).order_by(SensorData.timestamp).all()
-            
-            # Get trigger logs for the same period
-            trigger_logs = TriggerLog.query.filter(
-                TriggerLog.timestamp >= start_dt,
-                TriggerLog.timestamp <= end_dt
-            ).order_by(TriggerLog.timestamp).all()
-            
-            # Aggregate sensor data by minute
-            aggregated_data = {}
-            for data in sensor_data:
-                # Round timestamp to the nearest minute
-                minute_key = data.timestamp.replace(second=0, microsecond=0)
-                minute_iso = minute_key.isoformat()
-                
-                if minute_iso not in aggregated_data:
-                    aggregated_data[minute_iso] = {
-                        'timestamp': minute_key,
-                        'temperatures': [],
-                        'fan_signals': [],
-                        'humidity_values': [],
-                        'hydrometer_a_values': [],
-                        'hydrometer_b_values': [],
-                        'count': 0
-                    }
-                
-                aggregated_data[minute_iso]['temperatures'].append(data.temp_f if data.temp_f is not None else 0)
-                aggregated_data[minute_iso]['fan_signals'].append(data.fan_signal if data.fan_signal is not None else 0)
-                aggregated_data[minute_iso]['humidity_values'].append(data.humidity if data.humidity is not None else 0)
-                aggregated_data[minute_iso]['hydrometer_a_values'].append(data.hydrometer_a if data.hydrometer_a is not None else 0)
-                aggregated_data[minute_iso]['hydrometer_b_values'].append(data.hydrometer_b if data.hydrometer_b is not None else 0)
-                aggregated_data[minute_iso]['count'] += 1
+            # Get sensor data (archived months and live SQLite rows, merged)
+            stored = load_sensor_columns(start_dt, end_dt)
+            # Fill in the readings ingest compression left out
+            columns = reconstruct(stored, until=min(end_dt, get_accurate_time()))
             
-            # Calculate averages for each minute
-            result = []
-            for minute_iso in sorted(aggregated_data.keys()):
-                agg = aggregated_data[minute_iso]
-                if agg['count'] > 0:
-                    result.append({
-                        'timestamp': agg['timestamp'].isoformat(),
-                        'temp_f': sum(agg['temperatures']) / agg['count'],
-                        'fan_signal': sum(agg['fan_signals']) / agg['count'],
-                        'hydrometer_a': sum(agg['hydrometer_a_values']) / agg['count'],
-                        'hydrometer_b': sum(agg['hydrometer_b_values']) / agg['count'],
-                        'humidity': sum(agg['humidity_values']) / agg['count'],
-                        'data_points': agg['count']
-                    })
+            # Get trigger logs for the same period, starting from the states in effect at its start
+            trigger_logs = [(start_dt, name, active) for name, active in trigger_states_at(start_dt).items()]
+            trigger_logs += db.session.execute(
+                db.select(TriggerLog.timestamp, TriggerLog.trigger_name, TriggerLog.active).where(
+                    TriggerLog.timestamp >= start_dt,
+                    TriggerLog.timestamp <= end_dt
+                ).order_by(TriggerLog.timestamp)
+            ).all()
             
-            # Build trigger log summary (by minute, taking the most recent state in each minute)
-            trigger_summary = {}
-            for log in trigger_logs:
-                minute_key = log.timestamp.replace(second=0, microsecond=0)
-                minute_iso = minute_key.isoformat()
-                
-                if minute_iso not in trigger_summary:
-                    trigger_summary[minute_iso] = {}
-                
-                # Store the most recent (latest) state for each trigger in this minute
-                trigger_summary[minute_iso][log.trigger_name] = log.active
+            # Aggregate sensor data by minute (missing values count as 0)
+            minutes, minute_index, counts = np.unique(columns['timestamp'].astype('datetime64[m]'),
+                                                      return_inverse=True, return_counts=True)
+            averages = {}
+            for field in SENSOR_FIELDS:
+                sums = np.bincount(minute_index, weights=np.nan_to_num(columns[field]), minlength=len(minutes))
+                averages[field] = sums / np.maximum(counts, 1)
+            # data_points reports stored readings, not the points reconstruct() filled in
+            counts = np.bincount(np.searchsorted(minutes, stored['timestamp'].astype('datetime64[m]')),
+                                 minlength=len(minutes))
             
-            return jsonify({
-                'sensor_data': result,
-                'trigger_logs': trigger_summary,
-                'aggregation': 'minute'
-            })
+            if columnar:
+                payload = _columnar_history(minutes, counts, averages, trigger_logs)
+            else:
+                payload = _row_history(minutes, counts, averages, trigger_logs)
+            if since:
+                if more:
+                    next_since = start_dt + timedelta(minutes=HISTORY_DELTA_MAX_MINUTES)
+                else:
+                    # Resume from the last minute returned; it is re-sent next time in case it was still filling
+                    next_since = minutes[-1].item() if len(minutes) else start_dt
+                payload['next_since'] = next_since.isoformat()
+                payload['more'] = more
+            immutable = (get_accurate_time() - end_dt).total_seconds() > HISTORY_IMMUTABLE_AFTER
+            if immutable:
+                # Rows still waiting in the reading journal (e.g. after a database outage) belong in this range
+                pending = oldest_unreplayed()
+                immutable = pending is None or pending > end_dt
+            return cached_json(payload, immutable=immutable)
         except Exception as e:
             print(f"Error in get_history: {e}")
             return jsonify({'error': str(e)}), 400
+    if columnar:
+        return jsonify({'format': 'columnar', 'start': None, 'step': 60, 'count': 0, 'fields': {},
+                        'data_points': [], 'triggers': {}})
     return jsonify({'sensor_data': [], 'trigger_logs': {}})
 
+
+def _row_history(minutes, counts, averages, trigger_logs):
+    """Original /api/history layout: one object per minute, trigger states keyed by minute."""
+    averages = {field: values.tolist() for field, values in averages.items()}
+    result = []
+    for i, minute_key in enumerate(minutes.tolist()):
+        result.append({
+            'timestamp': minute_key.isoformat(),
+            'temp_f': averages['temp_f'][i],
+            'fan_signal': averages['fan_signal'][i],
+            'hydrometer_a': averages['hydrometer_a'][i],
+            'hydrometer_b': averages['hydrometer_b'][i],
+            'humidity': averages['humidity'][i],
+            'data_points': int(counts[i])
+        })
+    
+    # Build trigger log summary (by minute, taking the most recent state in each minute). Rows are
+    # only logged on changes, so states carry forward to every minute with sensor data
+    changes = {}
+    for timestamp, trigger_name, active in trigger_logs:
+        minute_iso = timestamp.replace(second=0, microsecond=0).isoformat()
+        changes.setdefault(minute_iso, []).append((trigger_name, active))
+    trigger_summary = {}
+    states = {}
+    for minute_iso in sorted(set(changes) | {row['timestamp'] for row in result}):
+        states.update(changes.get(minute_iso, []))
+        if states:
+            trigger_summary[minute_iso] = dict(states)
+    
+    return {
+        'sensor_data': result,
+        'trigger_logs': trigger_summary,
+        'aggregation': 'minute'
+    }
+
+
+def _columnar_history(minutes, counts, averages, trigger_logs):
+    """Compact /api/history layout on a dense per-minute grid starting at the first minute with data."""
+    trigger_minutes = np.array([ts for ts, _, _ in trigger_logs], dtype='datetime64[us]').astype('datetime64[m]')
+    candidates = [grid for grid in (minutes, trigger_minutes) if len(grid)]
+    if not candidates:
+        return {'format': 'columnar', 'start': None, 'step': 60, 'count': 0, 'fields': {},
+                'data_points': [], 'triggers': {}}
+    grid_start = min(grid[0] for grid in candidates)
+    grid_end = max(grid[-1] for grid in candidates)
+    count = int((grid_end - grid_start) // np.timedelta64(1, 'm')) + 1
+    offsets = ((minutes - grid_start) // np.timedelta64(1, 'm')).astype(np.int64)
+
+    fields = {}
+    for field in SENSOR_FIELDS:
+        dense = np.full(count, np.nan)
+        dense[offsets] = np.round(averages[field], 2)
+        fields[field] = [None if math.isnan(v) else v for v in dense.tolist()]
+    data_points = np.zeros(count, dtype=np.int64)
+    data_points[offsets] = counts
+
+    # Run-length encode each trigger: only minutes where its state changes
+    triggers = {}
+    trigger_offsets = ((trigger_minutes - grid_start) // np.timedelta64(1, 'm')).astype(np.int64).tolist()
+    for offset, (_, trigger_name, active) in zip(trigger_offsets, trigger_logs):
+        transitions = triggers.setdefault(trigger_name, [])
+        if transitions and transitions[-1][0] == offset:
+            transitions[-1][1] = active  # Latest state within the minute wins
+            if len(transitions) > 1 and transitions[-2][1] == active:
+                transitions.pop()
+        elif not transitions or transitions[-1][1] != active:
+            transitions.append([offset, active])
+
+    return {
+        'format': 'columnar',
+        'start': grid_start.item().isoformat(),
+        'step': 60,
+        'count': count,
+        'fields': fields,
+        'data_points': data_points.tolist(),
+        'triggers': triggers
+    }
+
+@app.route('/api/export')
+def export_data():
+    """Stream raw or aggregated history as CSV, NDJSON or Parquet.
+
+    Query params: table (sensor|triggers|watering), start, end, format (csv|ndjson|parquet),
+    aggregate (minute|hour|day, sensor only), gzip (1 to compress).
+    """
+    table = request.args.get('table', 'sensor')
+    fmt = request.args.get('format', 'csv')
+    aggregate = request.args.get('aggregate') or None
+    compress = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    try:
+        start_dt = parse_timestamp(request.args.get('start'))
+        end_dt = parse_timestamp(request.args.get('end'))
+        parts = generate_export(table, fmt, start_dt, end_dt, aggregate, compress)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    mimetype = 'application/gzip' if compress else EXPORT_FORMATS[fmt][0]
+    filename = export_filename(table, fmt, aggregate, compress)
+    return Response(stream_with_context(parts), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @app.route('/api/available-dates')
 def get_available_dates():
     year = request.args.get('year', type=int)
@@ -540,54 +831,140 @@ def get_available_dates():
     month_end = month_start + relativedelta(months=1) + relativedelta(days=1)
     
     # Get all dates with data for this month and nearby dates
-    data = SensorData.query.filter(
-        SensorData.timestamp >= month_start,
-        SensorData.timestamp < month_end
-    ).all()
+    days = db.session.execute(
+        db.select(db.func.distinct(db.func.date(SensorData.timestamp))).where(
+            SensorData.timestamp >= month_start,
+            SensorData.timestamp < month_end
+        )
+    ).scalars().all()
     
-    # Extract unique dates
-    dates_with_data = set()
-    for record in data:
-        dates_with_data.add(record.timestamp.date().day)
+    # Extract unique dates (including months already moved to the archive)
+    dates_with_data = set(datetime.fromisoformat(day).day for day in days)
+    for archived in archived_months():
+        for day in archived['days']:
+            day_dt = datetime.fromisoformat(day)
+            if month_start <= day_dt < month_end:
+                dates_with_data.add(day_dt.day)
     
     return jsonify({'dates': sorted(list(dates_with_data))})
 
 @app.route('/api/db_info')
 def get_db_info():
     try:
-        record_count = SensorData.query.count()
-        db_path = 'instance/database.db'
-        if os.path.exists(db_path):
-            db_size = os.path.getsize(db_path)
-        else:
-            db_size = 0
-        return jsonify({
-            'record_count': record_count,
-            'db_size': db_size
-        })
+        return jsonify(db_info())
     except Exception as e:
         return jsonify({'error': str(e)})
 
+def db_info():
+    record_count = SensorData.query.count()
+    db_path = 'instance/database.db'
+    if os.path.exists(db_path):
+        db_size = os.path.getsize(db_path)
+    else:
+        db_size = 0
+    archived_count = sum(month['rows'] for month in archived_months())
+    return {
+        'record_count': record_count + archived_count,
+        'db_size': db_size,
+        'archived_record_count': archived_count,
+        'archive_size': archive_size(),
+        'images': image_stats(CAMERA_FOLDER)
+    }
+
+@app.route('/api/analytics')
+def get_analytics():
+    """Daily climate metrics and range totals: VPD, degree-hours above TARGET_TEMP_F, hours outside the
+    humidity range, fan duty cycle and soil drying rates.
+
+    start/end are dates (YYYY-MM-DD, default: the last 7 days). Closed days come from the
+    daily_summary cache and only today is recomputed; refresh=1 recomputes cached days. The web
+    tier never writes the cache; the ingest process keeps every closed day in it.
+    """
+    try:
+        today = get_accurate_time().date()
+        end_day = date.fromisoformat(request.args['end']) if request.args.get('end') else today
+        start = request.args.get('start')
+        start_day = date.fromisoformat(start) if start else end_day - timedelta(days=6)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid start/end: {e}'}), 400
+    if start_day > end_day:
+        return jsonify({'error': 'start must not be after end'}), 400
+    try:
+        days = daily_summaries(start_day, end_day, refresh=request.args.get('refresh') == '1', store=ROLE != 'web')
+    except Exception as e:
+        print(f"Error in get_analytics: {e}")
+        return jsonify({'error': str(e)}), 500
+    return cached_json({
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'target_temp_f': TARGET_TEMP_F,
+        'humidity_range': [TARGET_HUMIDITY - HUMIDITY_RANGE, TARGET_HUMIDITY + HUMIDITY_RANGE],
+        'totals': summarize(days),
+        'days': days
+    })
+
+
+def _zone_json(zone):
+    return {
+        'zone_id': zone.id,
+        'name': zone.name,
+        'enabled': zone.enabled,
+        'duration_seconds': zone.duration_seconds,
+        'interval_hours': zone.interval_hours,
+        'last_watered': zone.last_watered.isoformat() if zone.last_watered else None,
+        'open_command': zone.open_command,
+        'close_command': zone.close_command,
+        'moisture_sensor': zone.moisture_sensor,
+        'moisture_threshold': zone.moisture_threshold,
+        'moisture_cooldown_minutes': zone.moisture_cooldown_minutes
+    }
+
+
 @app.route('/api/watering/schedule', methods=['GET'])
 def get_watering_schedule():
-    schedule = WateringSchedule.query.first()
+    zone_id = request.args.get('zone_id', 1, type=int)
+    schedule = db.session.get(WateringSchedule, zone_id)
     if not schedule:
+        if zone_id != 1:
+            return jsonify({'error': f'Unknown zone {zone_id}'}), 404
         return jsonify({'enabled': True, 'duration_seconds': 2.0, 'interval_hours': 8.0, 'last_watered': None})
-    return jsonify({
-        'enabled': schedule.enabled,
-        'duration_seconds': schedule.duration_seconds,
-        'interval_hours': schedule.interval_hours,
-        'last_watered': schedule.last_watered.isoformat() if schedule.last_watered else None
-    })
+    return jsonify(_zone_json(schedule))
+
+
+@app.route('/api/watering/zones')
+def get_watering_zones():
+    zones = WateringSchedule.query.order_by(WateringSchedule.id).all()
+    return jsonify([_zone_json(zone) for zone in zones])
 
 
 @app.route('/api/watering/schedule', methods=['POST'])
 def set_watering_schedule():
     data = request.json
-    schedule = WateringSchedule.query.first()
+    try:
+        if ROLE == 'web':
+            daemon_call('schedule', data=data)
+        else:
+            update_watering_schedule(data)
+    except (ValueError, RuntimeError) as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    return jsonify({'status': 'ok'})
+
+
+def update_watering_schedule(data):
+    """Apply a partial update to one zone (zone_id, default 1), creating it if needed.
+
+    Must be called inside an app context. Out-of-range numbers are ignored as before; invalid
+    valve commands or sensor names raise ValueError.
+    """
+    zone_id = int(data.get('zone_id', 1))
+    schedule = db.session.get(WateringSchedule, zone_id)
     if not schedule:
-        schedule = WateringSchedule()
+        if zone_id != 1 and not ('open_command' in data and 'close_command' in data):
+            raise ValueError('A new zone needs open_command and close_command')
+        schedule = WateringSchedule(id=zone_id, name=f'Zone {zone_id}')
         db.session.add(schedule)
+    if 'name' in data:
+        schedule.name = str(data['name'])[:50]
     if 'enabled' in data:
         schedule.enabled = bool(data['enabled'])
     if 'duration_seconds' in data:
@@ -595,20 +972,50 @@ def set_watering_schedule():
         if 0 < val <= 60:
             schedule.duration_seconds = val
     if 'interval_hours' in data:
-        val = float(data['interval_hours'])
-        if 0 < val <= 168:
+        # 0 (or null) turns off timed watering, leaving only moisture-driven cycles
+        val = float(data['interval_hours'] or 0)
+        if 0 <= val <= 168:
             schedule.interval_hours = val
+    for key in ('open_command', 'close_command'):
+        if key in data:
+            cmd = str(data[key]).strip()
+            if not cmd or len(cmd) > 20 or '\n' in cmd:
+                raise ValueError(f'Invalid {key}: {data[key]!r}')
+            setattr(schedule, key, cmd)
+    if 'moisture_sensor' in data:
+        if data['moisture_sensor'] not in (None, 'hydrometer_a', 'hydrometer_b'):
+            raise ValueError(f"Invalid moisture_sensor: {data['moisture_sensor']!r}")
+        schedule.moisture_sensor = data['moisture_sensor']
+    if 'moisture_threshold' in data:
+        if data['moisture_threshold'] is None:
+            schedule.moisture_threshold = None
+        else:
+            val = float(data['moisture_threshold'])
+            if 0 <= val <= 100:
+                schedule.moisture_threshold = val
+    if 'moisture_cooldown_minutes' in data:
+        val = float(data['moisture_cooldown_minutes'])
+        if 1 <= val <= 7 * 24 * 60:
+            schedule.moisture_cooldown_minutes = val
     db.session.commit()
-    return jsonify({'status': 'ok'})
+    zone_scheduler.wake()
+    dashboard.invalidate('watering')
 
 
 @app.route('/api/watering/run', methods=['POST'])
 def run_watering_now():
-    """Immediately trigger one watering cycle using the current duration setting."""
-    schedule = WateringSchedule.query.first()
+    """Immediately trigger one watering cycle of a zone (default 1) using its duration setting."""
+    data = request.get_json(silent=True) or {}
+    zone_id = int(data.get('zone_id', 1))
+    schedule = db.session.get(WateringSchedule, zone_id)
+    if not schedule and zone_id != 1:
+        return jsonify({'status': 'error', 'error': f'Unknown zone {zone_id}'}), 404
     duration = schedule.duration_seconds if schedule else 2.0
-    threading.Thread(target=run_watering_cycle, args=(duration, 'manual'), daemon=True).start()
-    return jsonify({'status': 'ok', 'duration_seconds': duration})
+    if ROLE == 'web':
+        daemon_call('water', duration_seconds=duration, zone_id=zone_id)
+    else:
+        threading.Thread(target=run_watering_cycle, args=(duration, 'manual', zone_id), daemon=True).start()
+    return jsonify({'status': 'ok', 'zone_id': zone_id, 'duration_seconds': duration})
 
 
 @app.route('/api/watering/log')
@@ -617,13 +1024,15 @@ def get_watering_log():
     return jsonify([{
         'timestamp': l.timestamp.isoformat(),
         'duration_seconds': l.duration_seconds,
-        'triggered_by': l.triggered_by
+        'triggered_by': l.triggered_by,
+        'zone_id': l.zone_id
     } for l in logs])
 
 
-def calculate_fan_speed():
-    """Calculate fan PWM value (0-255) based on latest sensor data using proportional scaling."""
-    latest = SensorData.query.order_by(SensorData.timestamp.desc()).first()
+def calculate_fan_speed(latest=None):
+    """Calculate fan PWM value (0-255) based on a reading (default: latest stored) using proportional scaling."""
+    if latest is None:
+        latest = SensorData.query.order_by(SensorData.timestamp.desc()).first()
     if not latest:
         return 0
     # Scale 0→255 as temp rises from TARGET_TEMP_F to TARGET_TEMP_F + TEMP_RANGE
@@ -634,11 +1043,9 @@ def calculate_fan_speed():
     return int(round(ratio * 255))
 
 
-def calculate_and_log_triggers():
-    """Calculate triggers from latest sensor data and log them to database"""
-    latest = SensorData.query.order_by(SensorData.timestamp.desc()).first()
+def evaluate_triggers(latest):
+    """Calculate trigger states from a sensor reading without touching the database"""
     triggers = []
-    
     if latest:
         temp = latest.temp_f
         humidity = latest.humidity
@@ -662,55 +1069,302 @@ def calculate_and_log_triggers():
             'active': fan > 0,
             'details': f'Current fan signal: {fan} (0 = relay OFF, fan fully powered down)'
         })
-        # Log each trigger state to database and capture images at start/stop
-        timestamp = latest.timestamp
+    return triggers
+
+
+def calculate_and_log_triggers(latest):
+    """Calculate triggers from a live reading and journal the states that changed.
+
+    Only read_serial calls this, for every reading, so _trigger_states always follows the newest
+    reading; everything else uses evaluate_triggers(). No database access; start/stop images are
+    captured on a separate thread.
+    """
+    triggers = evaluate_triggers(latest)
+    
+    if latest:
+        # Only state changes are logged; readers carry each state forward
+        rows = []
         for trigger in triggers:
-            # Check previous state for this trigger
-            prev_log = TriggerLog.query.filter_by(trigger_name=trigger['name']).order_by(TriggerLog.timestamp.desc()).first()
-            prev_active = prev_log.active if prev_log else None
+            prev_active = _trigger_states.get(trigger['name'])
+            if prev_active == trigger['active']:
+                continue
             # Detect start (False->True) and stop (True->False)
-            if prev_active is not None and prev_active != trigger['active']:
+            if prev_active is not None:
                 event_type = 'start' if trigger['active'] else 'stop'
-                # Capture image with overlay
-                result = capture_and_overlay_image(trigger_event=event_type.capitalize(), trigger_name=trigger['name'])
-                if result is not None:
-                    img, ts = result
-                    filename = ts.strftime("%Y%m%d_%H%M%S") + f"_{trigger['name'].replace(' ','_')}_{event_type}.jpg"
-                    filepath = os.path.join(CAMERA_FOLDER, filename)
-                    img.save(filepath)
-            log_entry = TriggerLog(
-                timestamp=timestamp,
-                trigger_name=trigger['name'],
-                active=trigger['active']
-            )
-            db.session.add(log_entry)
+                threading.Thread(target=_save_trigger_image, args=(trigger['name'], event_type, latest),
+                                 daemon=True).start()
+            _trigger_states[trigger['name']] = trigger['active']
+            rows.append({'timestamp': latest.timestamp, 'trigger_name': trigger['name'], 'active': trigger['active']})
         try:
-            db.session.commit()
+            journal.append(rows, table='trigger_log')
         except Exception as e:
-            db.session.rollback()
             print(f"Error logging triggers: {e}")
     return triggers
 
+
+def _save_trigger_image(trigger_name, event_type, reading):
+    """Capture and save a trigger start/stop image with the reading that caused it."""
+    try:
+        with app.app_context():
+            result = capture_and_overlay_image(trigger_event=event_type.capitalize(), trigger_name=trigger_name,
+                                               latest_data=reading)
+        if result is not None:
+            img, ts = result
+            filename = ts.strftime("%Y%m%d_%H%M%S") + f"_{trigger_name.replace(' ','_')}_{event_type}.jpg"
+            img.save(os.path.join(CAMERA_FOLDER, filename))
+    except Exception as e:
+        print(f"Error saving trigger image: {e}")
+
+
+def trigger_states_at(timestamp):
+    """Each trigger's last logged state before timestamp, i.e. its state at that time. Must run in an app context."""
+    states = {}
+    name = ''
+    while True:
+        # One index lookup per trigger name instead of scanning the table
+        name = db.session.execute(
+            db.select(db.func.min(TriggerLog.trigger_name)).where(TriggerLog.trigger_name > name)
+        ).scalar()
+        if name is None:
+            return states
+        active = db.session.execute(
+            db.select(TriggerLog.active).where(TriggerLog.trigger_name == name, TriggerLog.timestamp < timestamp)
+            .order_by(TriggerLog.timestamp.desc()).limit(1)
+        ).scalar()
+        if active is not None:
+            states[name] = active
+
+
+def load_trigger_states():
+    """Seed _trigger_states with each trigger's newest state, logged or still in the journal."""
+    try:
+        with app.app_context():
+            _trigger_states.update(trigger_states_at(datetime.max))
+    except Exception as e:
+        print(f"[Startup] Could not load trigger states: {e}")
+    pending, _ = journal.read_pending(float('inf'))
+    _trigger_states.update({row['trigger_name']: row['active'] for row in pending if row.get('table') == 'trigger_log'})
+
 @app.route('/api/triggers')
 def get_triggers():
-    """Get current trigger states (calculated from latest sensor data)"""
-    return jsonify(calculate_and_log_triggers())
+    """Get current trigger states (calculated from the latest reading, not logged)"""
+    # Trigger states are logged by read_serial alone; an older stored row would flip them back
+    return jsonify(evaluate_triggers(latest_reading()))
 
-if __name__ == '__main__':
+
+def latest_reading():
+    """Newest reading received, including ones compression did not store (not added to the session).
+
+    The ingest process holds it in memory and the web tier asks the daemon for it; the newest
+    stored row is the fallback.
+    """
+    if ROLE != 'web':
+        reading = compressor.latest
+    else:
+        try:
+            reading = daemon_call('latest_reading', timeout=2)
+        except Exception as e:
+            print(f"[IPC] Could not get latest reading from daemon: {e}")
+            reading = None
+    if reading:
+        return SensorData(**reading)
+    return SensorData.query.order_by(SensorData.timestamp.desc()).first()
+
+
+dashboard = SnapshotCache({
+    'data': lambda: _reading_json(latest_reading()),
+    'triggers': lambda: evaluate_triggers(latest_reading()),
+    'watering': lambda: [_zone_json(zone) for zone in WateringSchedule.query.order_by(WateringSchedule.id).all()],
+    'camera': latest_image_info,
+    'db_info': db_info
+})
+
+
+@app.route('/api/dashboard')
+def get_dashboard():
+    """Latest reading, triggers, watering zones, latest image and database info in one response.
+
+    Sections come from short-lived caches (DASHBOARD_TTLS) and triggers are evaluated without being
+    logged. ?fields=data,triggers limits the response to those sections; an unchanged snapshot
+    answers 304 to If-None-Match.
+    """
+    fields = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    try:
+        snapshot = dashboard.snapshot(fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in get_dashboard: {e}")
+        return jsonify({'error': str(e)}), 500
+    return cached_json(snapshot)
+
+
+@app.errorhandler(DaemonUnavailable)
+def daemon_unavailable(e):
+    print(f"[IPC] {e}")
+    return jsonify({'status': 'error', 'error': str(e)}), 503
+
+
+def ingest_health():
+    """Health of the ingestion side: serial link, last stored reading and background threads."""
+    threads = {name: thread.is_alive() for name, thread in _background_threads.items()}
+    serial_open = bool(ser and ser.is_open)
+    with _watering_locks_guard:
+        watering_zones = sorted(zone_id for zone_id, lock in _watering_locks.items() if lock.locked())
+    backlog = journal.status(get_accurate_time())
+    ok = serial_open and threads and all(threads.values()) and backlog['backlog_seconds'] <= JOURNAL_BACKLOG_WARN
+    return {
+        'status': 'ok' if ok else 'degraded',
+        'serial_port': SERIAL_PORT,
+        'serial_open': serial_open,
+        'last_reading': last_reading_at.isoformat() if last_reading_at else None,
+        'watering_in_progress': bool(watering_zones),
+        'watering_zones': watering_zones,
+        'compression': {'mode': compressor.mode, 'received': compressor.received,
+                        'stored': compressor.stored, 'ratio': compressor.ratio},
+        'live_view': live_stream.status(),
+        'journal': backlog,
+        'threads': threads
+    }
+
+
+@app.route('/healthz')
+def healthz():
+    """Health check for the web tier, including the ingest daemon when running split."""
+    health = {'role': ROLE}
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        health['database'] = 'ok'
+    except Exception as e:
+        health['database'] = f'error: {e}'
+    if ROLE == 'web':
+        try:
+            health['ingest'] = daemon_call('health', timeout=2)
+        except Exception as e:
+            health['ingest'] = {'status': 'unreachable', 'error': str(e)}
+    else:
+        health['ingest'] = ingest_health()
+    ok = health['database'] == 'ok' and health['ingest']['status'] == 'ok'
+    health['status'] = 'ok' if ok else 'degraded'
+    health['startup_ms'] = STARTUP_TIMINGS
+    return jsonify(health), 200 if ok else 503
+
+
+def _add_missing_columns():
+    """create_all() never alters existing tables, so add columns introduced after a database was created."""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(db.engine.dialect)
+            db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            if column.default is not None and column.default.is_scalar:
+                db.session.execute(db.text(f'UPDATE {table.name} SET {column.name} = :value'),
+                                   {'value': column.default.arg})
+            print(f'[DB] Added column {table.name}.{column.name}')
+    db.session.commit()
+
+
+def init_db():
+    """Create tables, seed the default watering schedule and enable WAL so readers never block the writer."""
     with app.app_context():
         db.create_all()
+        _add_missing_columns()
+        # create_all() skips existing tables, so add indexes introduced after a database was created
+        for table in db.metadata.tables.values():
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        db.session.execute(db.text('PRAGMA journal_mode=WAL'))
         # Seed default watering schedule if none exists
         if not WateringSchedule.query.first():
             db.session.add(WateringSchedule(enabled=True, duration_seconds=2.0, interval_hours=8.0))
-            db.session.commit()
-    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-        init_serial()
-        threading.Thread(target=read_serial, daemon=True).start()
-        threading.Thread(target=watering_scheduler, daemon=True).start()
-        # Send correct device states based on active triggers
+        db.session.commit()
+
+
+def ntp_sync_loop():
+    """Background thread: keep the NTP clock offset used by get_accurate_time() fresh."""
+    while not shutdown_event.is_set():
+        sync_ntp_offset()
+        shutdown_event.wait(NTP_SYNC_INTERVAL)
+
+
+def apply_initial_device_states():
+    """Send correct device states based on active triggers once the process is up."""
+    try:
+        with app.app_context():
+            apply_device_states()
+    except Exception as e:
+        print(f"[Startup] Could not apply initial device states: {e}")
+
+
+def start_background_tasks():
+    """Open the serial port and start ingestion and scheduling threads. Only one process may do this."""
+    init_serial()
+    journal.open()
+    load_trigger_states()
+    for target in (read_serial, journal_replayer, watering_scheduler, archive_scheduler, image_maintenance_scheduler,
+                   ntp_sync_loop):
+        thread = threading.Thread(target=target, name=target.__name__, daemon=True)
+        thread.start()
+        _background_threads[target.__name__] = thread
+    # Trigger evaluation may capture images, so keep it off the path to serving requests
+    threading.Thread(target=apply_initial_device_states, daemon=True).start()
+    mark_startup_phase('background_tasks')
+
+
+def stop_background_tasks(timeout=70):
+    """Stop background threads, let a running watering cycle finish, close the valve and the port."""
+    shutdown_event.set()
+    zone_scheduler.wake()
+    deadline = time.monotonic() + timeout
+    with _watering_locks_guard:
+        locks = list(_watering_locks.items())
+    for zone_id, lock in locks:
+        if lock.acquire(timeout=max(0, deadline - time.monotonic())):
+            lock.release()
+        else:
+            print(f'[Shutdown] Zone {zone_id} watering cycle did not finish in time')
+    try:
+        close_commands = sorted({zone['close_command'] for zone in load_watering_zones()})
+    except Exception as e:
+        print(f'[Shutdown] Could not load watering zones: {e}')
+        close_commands = ['W0']
+    for cmd in close_commands:
+        send_command(cmd)
+    for name, thread in _background_threads.items():
+        thread.join(timeout=5)
+    # read_serial may have journaled its last readings after the replayer's final pass
+    try:
         with app.app_context():
-            current_triggers = calculate_and_log_triggers()
-            fan_speed = calculate_fan_speed()
-            send_command(f"F:{fan_speed}")
-            send_command("W0")  # Valve defaults closed; control separately
+            replay(journal)
+    except Exception as e:
+        print(f'[Shutdown] Journal not fully replayed, the rest is replayed on next start: {e}')
+    if not _background_threads['read_serial'].is_alive():
+        journal.close()
+    close_serial()
+
+
+def create_app(argv=None):
+    """App factory: apply command line arguments and prepare the database. Returns the Flask app.
+
+    Pass argv=[] to ignore sys.argv (e.g. under a WSGI server). The web tier leaves
+    database setup to the ingest daemon.
+    """
+    configure_from_args(argv)
+    mark_startup_phase('configure')
+    if ROLE != 'web':
+        init_db()
+        mark_startup_phase('init_db')
+    return app
+
+
+mark_startup_phase('import')
+
+if __name__ == '__main__':
+    create_app()
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+        log_startup_timings()
     app.run(debug=True, host='0.0.0.0')
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+archive.py - Columnar archive for closed months of sensor history
+Each archived month is a directory of .npy files (one per column) plus index.json.
+Readers memory-map the arrays and binary-search the sorted timestamps, so a query
+only touches the pages covering its range; recent data is still read from SQLite.
+
+Usage:
+  python archive.py            # archive closed months older than ARCHIVE_KEEP_MONTHS
+  python archive.py --list     # show archived months
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import delete, func, select
+
+from config import ARCHIVE_FOLDER, ARCHIVE_KEEP_MONTHS, EXPORT_CHUNK_ROWS
+from models import db, SensorData
+
+SENSOR_FIELDS = ['temp_f', 'fan_signal', 'hydrometer_a', 'hydrometer_b', 'humidity']
+
+
+def _month_dir(month_start):
+    return os.path.join(ARCHIVE_FOLDER, month_start.strftime('%Y-%m'))
+
+
+def archived_months():
+    """Return the index of every archived month, oldest first."""
+    if not os.path.isdir(ARCHIVE_FOLDER):
+        return []
+    months = []
+    for name in sorted(os.listdir(ARCHIVE_FOLDER)):
+        if '.' in name:
+            continue  # <month>.tmp / <month>.old: a write in progress
+        index_path = os.path.join(ARCHIVE_FOLDER, name, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                months.append(json.load(f))
+    return months
+
+
+def archive_size():
+    """Total bytes used by the archive on disk."""
+    total = 0
+    for root, dirs, files in os.walk(ARCHIVE_FOLDER):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def _open_month(month, fields):
+    path = os.path.join(ARCHIVE_FOLDER, month['month'])
+    columns = {'timestamp': np.load(os.path.join(path, 'timestamp.npy'), mmap_mode='r')}
+    for field in fields:
+        columns[field] = np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r')
+    return columns
+
+
+def _empty_columns(fields):
+    columns = {'timestamp': np.empty(0, dtype='datetime64[us]')}
+    for field in fields:
+        columns[field] = np.empty(0, dtype=np.float64)
+    return columns
+
+
+def read_archive(start=None, end=None, fields=SENSOR_FIELDS):
+    """Read archived rows with start <= timestamp <= end as a dict of NumPy arrays."""
+    lo = np.datetime64(start, 'us') if start is not None else None
+    hi = np.datetime64(end, 'us') if end is not None else None
+    parts = []
+    for month in archived_months():
+        if lo is not None and np.datetime64(month['last'], 'us') < lo:
+            continue
+        if hi is not None and np.datetime64(month['first'], 'us') > hi:
+            continue
+        columns = _open_month(month, fields)
+        timestamps = columns['timestamp']
+        left = int(np.searchsorted(timestamps, lo, side='left')) if lo is not None else 0
+        right = int(np.searchsorted(timestamps, hi, side='right')) if hi is not None else len(timestamps)
+        if right > left:
+            # Slicing the memmap only pages in the rows inside the range
+            parts.append({name: np.array(array[left:right]) for name, array in columns.items()})
+    if not parts:
+        return _empty_columns(fields)
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def read_live(start=None, end=None, fields=SENSOR_FIELDS):
+    """Read rows still in SQLite as a dict of NumPy arrays. Must be called inside an app context."""
+    query = select(SensorData.timestamp, *[getattr(SensorData, f) for f in fields])
+    if start is not None:
+        query = query.where(SensorData.timestamp >= start)
+    if end is not None:
+        query = query.where(SensorData.timestamp <= end)
+    rows = db.session.execute(query.order_by(SensorData.timestamp)).all()
+    if not rows:
+        return _empty_columns(fields)
+    values = list(zip(*rows))
+    columns = {'timestamp': np.array(values[0], dtype='datetime64[us]')}
+    for i, field in enumerate(fields, start=1):
+        # None becomes NaN
+        columns[field] = np.array(values[i], dtype=np.float64)
+    return columns
+
+
+def load_sensor_columns(start=None, end=None, fields=SENSOR_FIELDS):
+    """Sensor history for a range as NumPy arrays, archive and live data merged in time order."""
+    archived = read_archive(start, end, fields)
+    live = read_live(start, end, fields)
+    if not len(archived['timestamp']):
+        return live
+    if not len(live['timestamp']):
+        return archived
+    merged = {name: np.concatenate([archived[name], live[name]]) for name in archived}
+    if archived['timestamp'][-1] > live['timestamp'][0]:
+        order = np.argsort(merged['timestamp'], kind='stable')
+        merged = {name: array[order] for name, array in merged.items()}
+    return merged
+
+
+def _write_month(month_start, month_end):
+    """Copy one month of SensorData into its archive directory. Returns the number of rows written."""
+    count = db.session.execute(
+        select(func.count()).select_from(SensorData)
+        .where(SensorData.timestamp >= month_start, SensorData.timestamp < month_end)
+    ).scalar()
+    if not count:
+        return 0
+    final_dir = _month_dir(month_start)
+    tmp_dir = final_dir + '.tmp'
+    old_dir = final_dir + '.old'
+    if os.path.exists(old_dir):
+        # A previous run stopped while swapping in a merged month: finish or undo the swap
+        if os.path.exists(final_dir):
+            shutil.rmtree(old_dir)
+        else:
+            os.replace(old_dir, final_dir)
+    # Rows are only deleted from SQLite after the month is in place, so a leftover .tmp is never the only copy
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    # Write straight into memory-mapped .npy files so a month never has to fit in RAM
+    columns = {'timestamp': np.lib.format.open_memmap(os.path.join(tmp_dir, 'timestamp.npy'), mode='w+',
+                                                      dtype='datetime64[us]', shape=(count,))}
+    for field in SENSOR_FIELDS:
+        columns[field] = np.lib.format.open_memmap(os.path.join(tmp_dir, f'{field}.npy'), mode='w+',
+                                                   dtype=np.float64, shape=(count,))
+    query = (select(SensorData.timestamp, *[getattr(SensorData, f) for f in SENSOR_FIELDS])
+             .where(SensorData.timestamp >= month_start, SensorData.timestamp < month_end)
+             .order_by(SensorData.timestamp)
+             .execution_options(yield_per=EXPORT_CHUNK_ROWS))
+    offset = 0
+    for partition in db.session.execute(query).partitions():
+        values = list(zip(*partition))
+        end = offset + len(partition)
+        columns['timestamp'][offset:end] = np.array(values[0], dtype='datetime64[us]')
+        for i, field in enumerate(SENSOR_FIELDS, start=1):
+            columns[field][offset:end] = np.array(values[i], dtype=np.float64)
+        offset = end
+    for array in columns.values():
+        array.flush()
+    del columns
+
+    if os.path.exists(final_dir):
+        # Month was archived before (e.g. late rows arrived): merge and drop duplicate timestamps
+        old = {name: np.load(os.path.join(final_dir, f'{name}.npy')) for name in ['timestamp'] + SENSOR_FIELDS}
+        new = {name: np.load(os.path.join(tmp_dir, f'{name}.npy')) for name in ['timestamp'] + SENSOR_FIELDS}
+        merged = {name: np.concatenate([old[name], new[name]]) for name in old}
+        _, keep = np.unique(merged['timestamp'], return_index=True)
+        for name, array in merged.items():
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), array[keep])
+
+    timestamps = np.load(os.path.join(tmp_dir, 'timestamp.npy'), mmap_mode='r')
+    index = {
+        'month': month_start.strftime('%Y-%m'),
+        'rows': int(len(timestamps)),
+        'first': str(timestamps[0]),
+        'last': str(timestamps[-1]),
+        'days': [d.isoformat() for d in np.unique(timestamps.astype('datetime64[D]')).tolist()],
+        'fields': SENSOR_FIELDS,
+        'archived_at': datetime.now().isoformat(),
+    }
+    del timestamps
+    with open(os.path.join(tmp_dir, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=2)
+    if os.path.exists(final_dir):
+        # Keep the previous month until the merged one is in place
+        os.replace(final_dir, old_dir)
+        os.replace(tmp_dir, final_dir)
+        shutil.rmtree(old_dir)
+    else:
+        os.replace(tmp_dir, final_dir)
+    return count
+
+
+def archive_closed_months(now=None):
+    """Move every closed month older than ARCHIVE_KEEP_MONTHS from SQLite into the archive.
+
+    Must be called inside an app context. Returns a list of (month, rows) that were archived.
+    """
+    now = now or datetime.now()
+    cutoff = datetime(now.year, now.month, 1) - relativedelta(months=ARCHIVE_KEEP_MONTHS)
+    oldest = db.session.execute(select(func.min(SensorData.timestamp))).scalar()
+    archived = []
+    if oldest is None:
+        return archived
+    month_start = datetime(oldest.year, oldest.month, 1)
+    while month_start < cutoff:
+        month_end = month_start + relativedelta(months=1)
+        rows = _write_month(month_start, month_end)
+        if rows:
+            db.session.execute(delete(SensorData).where(SensorData.timestamp >= month_start,
+                                                        SensorData.timestamp < month_end))
+            db.session.commit()
+            archived.append((month_start.strftime('%Y-%m'), rows))
+            print(f"[Archive] Moved {rows} readings from {month_start.strftime('%Y-%m')} to {_month_dir(month_start)}")
+        month_start = month_end
+    return archived
+
+
+def main():
+    from flask import Flask
+    from config import DATABASE_URI
+
+    parser = argparse.ArgumentParser(description='Archive closed months of auto-farm sensor data')
+    parser.add_argument('--list', '-l', action='store_true', help='List archived months and exit')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM the database afterwards to reclaim disk space')
+    args = parser.parse_args()
+
+    if args.list:
+        for month in archived_months():
+            print(f"{month['month']}: {month['rows']} readings ({month['first']} .. {month['last']})")
+        return 0
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    db.init_app(app)
+    with app.app_context():
+        archived = archive_closed_months()
+        if not archived:
+            print('Nothing to archive.')
+        elif args.vacuum:
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql('VACUUM')
+            print('Database vacuumed.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# auto-farm ingest compression: which readings to store, and how readers fill in the rest
+import math
+
+import numpy as np
+
+from config import COMPRESSION_MODE, COMPRESSION_MAX_INTERVAL, COMPRESSION_TOLERANCES
+
+COMPRESSION_MODES = ('off', 'deadband', 'swinging_door')
+RECONSTRUCT_STEP = 10  # Seconds between points filled in between stored rows
+
+
+def _differs(a, b):
+    return math.isnan(a) != math.isnan(b)
+
+
+class ReadingCompressor:
+    """Decides which readings are stored. offer() takes a reading dict (timestamp plus one value per
+    field) and returns the readings to store now, oldest first.
+
+    deadband stores a reading when any field moved more than its tolerance since the last stored
+    row; readers hold each value until the next row. swinging_door keeps a corridor of slopes per
+    field around the line from the last stored row and, when a reading falls outside, stores the
+    previous reading instead; readers interpolate linearly. Both store a row at least every
+    max_interval seconds.
+    """
+
+    def __init__(self, mode=COMPRESSION_MODE, tolerances=COMPRESSION_TOLERANCES,
+                 max_interval=COMPRESSION_MAX_INTERVAL):
+        if mode not in COMPRESSION_MODES:
+            raise ValueError(f'Unknown compression mode: {mode!r}')
+        self.mode = mode
+        self.tolerances = tolerances
+        self.max_interval = max_interval
+        self.anchor = None   # Last stored reading
+        self.pending = None  # swinging_door: newest reading inside the corridor, not stored yet
+        self.latest = None   # Newest reading offered
+        self.slopes = {}     # swinging_door: field -> (lowest, highest) slope still allowed
+        self.received = 0
+        self.stored = 0
+
+    @property
+    def ratio(self):
+        """Readings received per row stored."""
+        return round(self.received / self.stored, 1) if self.stored else None
+
+    def offer(self, reading):
+        self.received += 1
+        self.latest = reading
+        if self.mode == 'off' or self.anchor is None:
+            rows = [reading]
+        elif self.mode == 'deadband':
+            rows = self._deadband(reading)
+        else:
+            rows = self._swinging_door(reading)
+        if rows:
+            self.anchor = rows[-1]
+            self.stored += len(rows)
+        return rows
+
+    def flush(self):
+        """The newest reading if it was held back, to be stored before shutting down."""
+        if self.latest is None or self.latest is self.anchor:
+            return []
+        self.anchor = self.latest
+        self.pending = None
+        self.slopes = {}
+        self.stored += 1
+        return [self.latest]
+
+    def _elapsed(self, reading):
+        return (reading['timestamp'] - self.anchor['timestamp']).total_seconds()
+
+    def _deadband(self, reading):
+        if self._elapsed(reading) >= self.max_interval:
+            return [reading]
+        for field, tolerance in self.tolerances.items():
+            last, value = self.anchor[field], reading[field]
+            if _differs(last, value) or abs(value - last) > tolerance:
+                return [reading]
+        return []
+
+    def _narrow(self, reading):
+        """Take reading into the corridor if the line from the anchor to it passes within tolerance of
+        every reading since the anchor, then narrow each field's corridor to pass within tolerance of
+        reading too. False (corridor unchanged) if the line does not fit.
+        """
+        dt = self._elapsed(reading)
+        if dt <= 0:
+            return False
+        slopes = {}
+        for field, tolerance in self.tolerances.items():
+            start, value = self.anchor[field], reading[field]
+            if _differs(start, value):
+                return False
+            if math.isnan(value):
+                continue
+            low, high = self.slopes.get(field, (-math.inf, math.inf))
+            # Checked before narrowing: this is the line readers draw if reading ends up stored
+            slope = (value - start) / dt
+            if not low <= slope <= high:
+                return False
+            slopes[field] = (max(low, slope - tolerance / dt), min(high, slope + tolerance / dt))
+        self.slopes.update(slopes)
+        return True
+
+    def _swinging_door(self, reading):
+        if self._elapsed(reading) < self.max_interval and self._narrow(reading):
+            self.pending = reading
+            return []
+        if self.pending is None:
+            # Nothing in between to fall back on (e.g. after a gap in readings)
+            self.slopes = {}
+            return [reading]
+        # Store the last reading that still fitted and restart the corridor from it
+        stored = self.pending
+        self.anchor = stored
+        self.pending = None
+        self.slopes = {}
+        if self._elapsed(reading) < self.max_interval and self._narrow(reading):
+            self.pending = reading
+            return [stored]
+        self.slopes = {}
+        return [stored, reading]
+
+
+def reconstruct(columns, until=None, mode=COMPRESSION_MODE, max_gap=COMPRESSION_MAX_INTERVAL,
+                step=RECONSTRUCT_STEP):
+    """Fill gaps between stored rows of load_sensor_columns() output with points every `step` seconds.
+
+    Values are held (deadband) or interpolated (swinging_door). The last row is also held up to
+    `until` (end of the range, at most now): newer readings may just not have been stored yet.
+    Gaps longer than max_gap plus one step are real outages and stay empty; with mode 'off'
+    columns are returned unchanged.
+    """
+    if mode == 'off' or not len(columns['timestamp']):
+        return columns
+    ts = columns['timestamp'].astype('datetime64[us]').astype(np.int64)
+    values = {name: np.asarray(array, dtype=np.float64) for name, array in columns.items() if name != 'timestamp'}
+    if until is not None:
+        # One more row at `until` repeating the last values; +1 so a grid point at `until` is kept
+        ts = np.append(ts, max(np.datetime64(until, 'us').astype(np.int64) + 1, ts[-1]))
+        values = {name: np.append(array, array[-1]) for name, array in values.items()}
+    step_us = int(step * 1_000_000)
+    gaps = np.diff(ts)
+    first = ts[:-1] // step_us + 1   # First grid point after each row
+    last = (ts[1:] - 1) // step_us   # Last grid point before the next row
+    counts = np.where(gaps <= (max_gap + step) * 1_000_000, np.maximum(last - first + 1, 0), 0)
+    total = int(counts.sum())
+    gap_of = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    grid = (first[gap_of] + offsets) * step_us
+    if mode == 'deadband':
+        weight = np.zeros(total)
+    else:
+        weight = (grid - ts[gap_of]) / gaps[gap_of]
+    keep = slice(None, -1) if until is not None else slice(None)
+    filled = {'timestamp': np.insert(ts, gap_of + 1, grid)[keep].astype('datetime64[us]')}
+    for name, array in values.items():
+        left, right = array[gap_of], array[gap_of + 1]
+        filled[name] = np.insert(array, gap_of + 1, left + (right - left) * weight)[keep]
+    return filled
@@ -1,16 +1,41 @@
 # auto-farm Configuration
-import ntplib
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 
-def get_accurate_time():
-    """Get current time from NTP server, fallback to system time if unavailable."""
+NTP_SERVER = 'pool.ntp.org'
+NTP_SYNC_INTERVAL = 3600    # Seconds between NTP re-syncs of the clock offset
+
+_ntp_offset = None          # NTP time minus system time, once a sync has succeeded
+_ntp_last_attempt = None
+_ntp_sync_lock = threading.Lock()
+
+def sync_ntp_offset():
+    """Query the NTP server once and remember how far the system clock is off."""
+    global _ntp_offset, _ntp_last_attempt
+    if not _ntp_sync_lock.acquire(blocking=False):
+        return  # A sync is already running
+    _ntp_last_attempt = datetime.now()
     try:
+        import ntplib
         client = ntplib.NTPClient()
-        response = client.request('pool.ntp.org', version=3, timeout=5)
-        return datetime.fromtimestamp(response.tx_time)
+        response = client.request(NTP_SERVER, version=3, timeout=5)
+        _ntp_offset = timedelta(seconds=response.offset)
     except Exception as e:
         print(f"Warning: Could not sync time with NTP server: {e}")
+    finally:
+        _ntp_sync_lock.release()
+
+def get_accurate_time():
+    """Get current time corrected by the last NTP sync, fallback to system time if not synced yet.
+
+    Never blocks on the network: the first call starts a sync in the background.
+    """
+    if _ntp_offset is None:
+        retry_due = _ntp_last_attempt is None or datetime.now() - _ntp_last_attempt > timedelta(minutes=5)
+        if retry_due and not _ntp_sync_lock.locked():
+            threading.Thread(target=sync_ntp_offset, daemon=True).start()
         return datetime.now()
+    return datetime.now() + _ntp_offset
 
 # Serial Port Configuration
 SERIAL_PORT = 'COM3'        # Change to your Arduino's port
@@ -36,3 +61,61 @@ HUMIDITY_RANGE = 15.0       # Humidity range above target for fan control
 # Data Logging
 LOG_INTERVAL_MS = 200       # Milliseconds between sensor reads on Arduino
 LOG_READS_PER_SEND = 6      # Number of reads before sending to Flask
+
+# Profiling (enable with: python app.py --profile)
+SLOW_QUERY_MS = 100         # Log queries slower than this along with their query plan
+PROFILE_FOLDER = 'profiles' # Where cProfile captures (.pstats) are written
+
+# Data Export
+EXPORT_CHUNK_ROWS = 5000    # Rows fetched from the database per chunk while streaming an export
+
+# Archive (closed months of SensorData moved to per-month NumPy column files)
+ARCHIVE_FOLDER = 'archive'
+ARCHIVE_KEEP_MONTHS = 1     # Closed months kept in SQLite before archiving (0 = archive as soon as a month ends)
+
+# Production mode (daemon.py + wsgi.py): local command channel from web workers to the ingest daemon
+IPC_HOST = '127.0.0.1'
+IPC_PORT = 5001
+IPC_KEY_FILE = 'instance/ipc.key'  # Random key created by the daemon (mode 0600); AUTO_FARM_IPC_KEY overrides it
+
+# History API
+HISTORY_IMMUTABLE_AFTER = 3600  # Seconds after a range ends before /api/history marks it immutable
+HISTORY_DELTA_MAX_MINUTES = 1440  # Most minutes returned by one /api/history?since= call
+DELTA_MAX_ROWS = 500        # Most rows per table returned by one /api/data?since= call
+
+# Ingest compression: store a reading only when a field leaves its tolerance band (deadband) or
+# corridor (swinging_door), or COMPRESSION_MAX_INTERVAL seconds have passed. 'off' stores every reading.
+COMPRESSION_MODE = 'off'            # 'off', 'deadband' or 'swinging_door'
+COMPRESSION_MAX_INTERVAL = 300      # Seconds; a row is stored at least this often
+COMPRESSION_TOLERANCES = {
+    'temp_f': 0.2,                  # °F (sensor resolution is ~0.18°F)
+    'humidity': 0.5,                # %
+    'hydrometer_a': 1.0,            # %
+    'hydrometer_b': 1.0,            # %
+    'fan_signal': 0,                # Any change of the fan command is stored
+}
+
+# Camera image maintenance (background job, see images.py)
+IMAGE_MAINTENANCE_INTERVAL = 3600   # Seconds between maintenance runs
+IMAGE_DEDUP_DISTANCE = 6            # Max differing bits (of 64) in the perceptual hash for a near-duplicate
+IMAGE_DEDUP_WINDOW = 600            # Seconds; only frames this close to the last kept frame are compared
+IMAGE_REENCODE_AFTER_DAYS = 7       # Re-encode images older than this
+IMAGE_REENCODE_FORMAT = 'jpeg'      # 'jpeg' (lower quality, same name) or 'webp'
+IMAGE_REENCODE_QUALITY = 60
+IMAGE_QUOTA_MB = 2048               # Oldest images are deleted above this size (0 = no limit)
+
+# Live view (/camera/live): one capture thread shared by all viewers
+LIVE_FPS = 5                        # Frames per second captured and sent
+LIVE_WIDTH = 640                    # Frames wider than this are scaled down (height follows)
+LIVE_JPEG_QUALITY = 70
+LIVE_IDLE_SECONDS = 10              # Release the webcam this long after the last viewer leaves
+
+# Reading journal: read_serial appends readings here and a replayer moves them into SQLite in batches
+JOURNAL_PATH = 'instance/readings.journal'
+JOURNAL_FSYNC_INTERVAL = 1.0        # Seconds between fsyncs (a power cut can lose at most this much)
+JOURNAL_REPLAY_INTERVAL = 1.0       # Seconds between replays into SQLite
+JOURNAL_BATCH_ROWS = 5000           # Most readings inserted per transaction
+JOURNAL_BACKLOG_WARN = 60           # Seconds; health is degraded while older readings wait in the journal
+
+# /api/dashboard: seconds each section of the snapshot is reused before it is rebuilt
+DASHBOARD_TTLS = {'data': 1, 'triggers': 1, 'watering': 10, 'camera': 5, 'db_info': 30}
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+daemon.py - Ingest daemon for production mode
+The single process that owns the serial port and the webcam: it stores readings, evaluates
+triggers, runs the watering and archive schedulers, and executes commands sent by the
+web workers (wsgi.py) over the local IPC channel.
+
+Usage:
+  python daemon.py --port /dev/ttyUSB0 --camera-index 0
+  python daemon.py --health        # exit code 0 if the running daemon is healthy
+"""
+
+import os
+import signal
+import sys
+import threading
+
+os.environ['AUTO_FARM_ROLE'] = 'daemon'
+
+import app as farm  # noqa: E402
+import ipc  # noqa: E402
+
+
+def _in_context(func):
+    def wrapper(**kwargs):
+        with farm.app.app_context():
+            return func(**kwargs)
+    return wrapper
+
+
+def _start_watering(duration_seconds, zone_id=1):
+    threading.Thread(target=farm.run_watering_cycle, args=(duration_seconds, 'manual', zone_id), daemon=True).start()
+    return {'zone_id': zone_id, 'duration_seconds': duration_seconds}
+
+
+HANDLERS = {
+    'command': lambda command: farm.send_command(command),
+    'water': _start_watering,
+    'reset': _in_context(farm.apply_device_states),
+    'capture': _in_context(farm.save_camera_capture),
+    'schedule': _in_context(farm.update_watering_schedule),
+    'health': farm.ingest_health,
+    'latest_reading': lambda: farm.compressor.latest,
+    'live_frame': lambda after: farm.live_stream.next_frame(after, timeout=2),
+}
+
+
+def check_health():
+    try:
+        health = ipc.call('health', timeout=5)
+    except Exception as e:
+        print(f"unreachable: {e}")
+        return 1
+    print(health)
+    return 0 if health['status'] == 'ok' else 1
+
+
+def main():
+    if '--health' in sys.argv:
+        return check_health()
+    farm.create_app()
+    try:
+        server = ipc.CommandServer(HANDLERS)
+    except OSError as e:
+        print(f"[Daemon] Cannot listen on {ipc.IPC_HOST}:{ipc.IPC_PORT} (is another daemon running?): {e}")
+        return 1
+    except RuntimeError as e:
+        print(f"[Daemon] {e}")
+        return 1
+    farm.start_background_tasks()
+    server.start()
+    farm.log_startup_timings()
+
+    def request_shutdown(signum, frame):
+        print(f"[Daemon] Received signal {signum}, shutting down...")
+        farm.shutdown_event.set()
+
+    signal.signal(signal.SIGINT, request_shutdown)
+    signal.signal(signal.SIGTERM, request_shutdown)
+    print('[Daemon] Running. Press Ctrl+C to stop.')
+    while not farm.shutdown_event.wait(1):
+        pass
+
+    server.close()
+    farm.stop_background_tasks()
+    print('[Daemon] Stopped.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# auto-farm dashboard snapshot: everything the index and TV pages show, from short-lived cached sections
+import threading
+import time
+
+from config import DASHBOARD_TTLS
+
+
+class SnapshotCache:
+    """Named sections, each rebuilt by its builder at most once per ttl seconds however many clients poll.
+
+    If a rebuild fails (e.g. the database is locked) the previous value is served until the next try.
+    """
+
+    def __init__(self, builders, ttls=DASHBOARD_TTLS):
+        self.builders = builders
+        self.ttls = ttls
+        self._values = {}  # name -> (built at, value)
+        self._locks = {name: threading.Lock() for name in builders}
+
+    def _fresh(self, name):
+        entry = self._values.get(name)
+        if entry and time.monotonic() - entry[0] < self.ttls.get(name, 0):
+            return entry
+        return None
+
+    def get(self, name):
+        entry = self._fresh(name)
+        if entry:
+            return entry[1]
+        with self._locks[name]:
+            # Another request may have rebuilt it while we waited
+            entry = self._fresh(name)
+            if entry:
+                return entry[1]
+            try:
+                value = self.builders[name]()
+            except Exception as e:
+                if name not in self._values:
+                    raise
+                print(f'[Dashboard] Could not refresh {name}, serving the previous value: {e}')
+                value = self._values[name][1]
+            self._values[name] = (time.monotonic(), value)
+            return value
+
+    def invalidate(self, *names):
+        """Rebuild these sections (default: all) on the next request."""
+        for name in names or list(self.builders):
+            self._values.pop(name, None)
+
+    def snapshot(self, fields=None):
+        """Dict of the requested sections (default: all). Raises ValueError for unknown names."""
+        names = fields or list(self.builders)
+        unknown = [name for name in names if name not in self.builders]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)} (available: {', '.join(self.builders)})")
+        return {name: self.get(name) for name in names}
@@ -0,0 +1,107 @@
+# auto-farm delta queries: everything newer than a client's cursor, in bounded batches
+from config import DELTA_MAX_ROWS
+from export import parse_timestamp
+from models import db, SensorData, TriggerLog, WateringLog
+
+
+def parse_since(value):
+    """Parse a since= value into (ids, timestamp).
+
+    A cursor is '<sensor_id>:<trigger_id>:<watering_id>' as returned by a previous delta; anything
+    else is read as an ISO timestamp, for clients that only know the time of their last reading.
+    """
+    parts = value.split(':')
+    if len(parts) == 3 and all(part.isdigit() for part in parts):
+        return tuple(int(part) for part in parts), None
+    return None, parse_timestamp(value)
+
+
+def format_cursor(ids):
+    return ':'.join(str(i) for i in ids)
+
+
+def _newer_rows(model, last_id, since_ts, limit):
+    """Up to `limit` rows after the cursor in id order, and whether more are waiting.
+
+    A timestamp cursor pages by id from the first row newer than it: ids are not always in time
+    order (clock corrections, late journal replay), so paging by timestamp and resuming from the
+    highest id would skip rows. Rows stored after that first one are included even if older.
+    """
+    if last_id is None:
+        first_id = db.session.query(db.func.min(model.id)).filter(model.timestamp > since_ts).scalar()
+        if first_id is None:
+            return [], False
+        last_id = first_id - 1
+    rows = model.query.filter(model.id > last_id).order_by(model.id).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def _next_id(model, rows, last_id):
+    if rows:
+        return max(row.id for row in rows)
+    if last_id is not None:
+        return last_id
+    # Timestamp cursor with nothing newer: everything stored so far has been seen
+    return db.session.query(db.func.max(model.id)).scalar() or 0
+
+
+def _trigger_transitions(rows):
+    """Keep only trigger rows whose state differs from the previous row of the same trigger."""
+    if not rows:
+        return []
+    first_id = min(row.id for row in rows)
+    previous = {}
+    for name in set(row.trigger_name for row in rows):
+        prev = TriggerLog.query.filter(TriggerLog.trigger_name == name, TriggerLog.id < first_id) \
+            .order_by(TriggerLog.id.desc()).first()
+        previous[name] = prev.active if prev else None
+    transitions = []
+    for row in rows:
+        if previous[row.trigger_name] != row.active:
+            transitions.append({
+                'id': row.id,
+                'timestamp': row.timestamp.isoformat(),
+                'trigger_name': row.trigger_name,
+                'active': row.active
+            })
+            previous[row.trigger_name] = row.active
+    return transitions
+
+
+def fetch_delta(since, limit=DELTA_MAX_ROWS):
+    """Readings, trigger transitions and watering events newer than `since`. Must run in an app context.
+
+    Each table is read at most `limit` rows past its cursor; 'more' tells the client to ask again
+    with the returned cursor straight away to finish catching up.
+    """
+    ids, since_ts = parse_since(since)
+    sensor_id, trigger_id, watering_id = ids if ids else (None, None, None)
+    readings, more_readings = _newer_rows(SensorData, sensor_id, since_ts, limit)
+    trigger_rows, more_triggers = _newer_rows(TriggerLog, trigger_id, since_ts, limit)
+    waterings, more_waterings = _newer_rows(WateringLog, watering_id, since_ts, limit)
+    cursor = (
+        _next_id(SensorData, readings, sensor_id),
+        _next_id(TriggerLog, trigger_rows, trigger_id),
+        _next_id(WateringLog, waterings, watering_id),
+    )
+    return {
+        'readings': [{
+            'id': r.id,
+            'timestamp': r.timestamp.isoformat(),
+            'temp_f': r.temp_f,
+            'fan_signal': r.fan_signal,
+            'hydrometer_a': r.hydrometer_a,
+            'hydrometer_b': r.hydrometer_b,
+            'humidity': r.humidity
+        } for r in readings],
+        'trigger_transitions': _trigger_transitions(trigger_rows),
+        'watering': [{
+            'id': w.id,
+            'timestamp': w.timestamp.isoformat(),
+            'duration_seconds': w.duration_seconds,
+            'triggered_by': w.triggered_by,
+            'zone_id': w.zone_id
+        } for w in waterings],
+        'cursor': format_cursor(cursor),
+        'more': more_readings or more_triggers or more_waterings
+    }
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+export.py - Streaming bulk export of sensor, trigger and watering history
+Rows are read from the database in fixed-size chunks and encoded as they arrive,
+so exporting a year of data uses the same memory as exporting an hour. Archived
+months of sensor data are read from the archive a day at a time, and so is every
+aggregated sensor export while ingest compression is on.
+
+Usage:
+  python export.py sensor --start 2024-01-01 --end 2025-01-01 --format csv -o sensor.csv
+  python export.py sensor --aggregate hour --format parquet -o hourly.parquet
+  python export.py triggers --format ndjson --gzip -o triggers.ndjson.gz
+"""
+
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import sys
+import zlib
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Boolean, DateTime, Float, Integer, func, select
+
+from analytics import MAX_SAMPLE_SECONDS, first_reading_day
+from archive import archived_months, load_sensor_columns
+from compression import reconstruct
+from config import COMPRESSION_MODE, COMPRESSION_MAX_INTERVAL, EXPORT_CHUNK_ROWS, get_accurate_time
+from models import db, SensorData, TriggerLog, WateringLog
+
+EXPORT_TABLES = {
+    'sensor': (SensorData, ['timestamp', 'temp_f', 'fan_signal', 'hydrometer_a', 'hydrometer_b', 'humidity']),
+    'triggers': (TriggerLog, ['timestamp', 'trigger_name', 'active']),
+    'watering': (WateringLog, ['timestamp', 'duration_seconds', 'triggered_by', 'zone_id']),
+}
+
+# strftime patterns that truncate a timestamp to the start of its bucket
+AGGREGATE_BUCKETS = {
+    'minute': '%Y-%m-%d %H:%M:00',
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d 00:00:00',
+}
+# The same buckets as NumPy datetime64 units, for archived data
+AGGREGATE_UNITS = {'minute': 'm', 'hour': 'h', 'day': 'D'}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def parse_timestamp(value):
+    """Parse an ISO timestamp as sent by the browser (optionally with a trailing 'Z')."""
+    if value is None:
+        return None
+    return datetime.fromisoformat(value[:-1] if value.endswith('Z') else value)
+
+
+def export_columns(table, aggregate=None):
+    """Column names of an export, in output order."""
+    columns = EXPORT_TABLES[table][1]
+    if aggregate:
+        return columns + ['data_points']
+    return columns
+
+
+def export_column_types(table, aggregate=None):
+    """SQLAlchemy type of each export column, in output order."""
+    model, columns = EXPORT_TABLES[table]
+    types = [getattr(model, c).type for c in columns]
+    if aggregate:
+        # Bucket, averages, row count
+        return [types[0]] + [Float() for _ in columns[1:]] + [Integer()]
+    return types
+
+
+def build_query(table, start=None, end=None, aggregate=None):
+    """Build the SELECT for a raw or bucket-averaged export over [start, end]."""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table '{table}', expected one of: {', '.join(EXPORT_TABLES)}")
+    model, columns = EXPORT_TABLES[table]
+    if aggregate:
+        if table != 'sensor':
+            raise ValueError('Aggregation is only supported for sensor data')
+        if aggregate not in AGGREGATE_BUCKETS:
+            raise ValueError(f"Unknown aggregate '{aggregate}', expected one of: {', '.join(AGGREGATE_BUCKETS)}")
+        bucket = func.strftime(AGGREGATE_BUCKETS[aggregate], model.timestamp)
+        query = select(bucket, *[func.avg(getattr(model, c)) for c in columns[1:]], func.count())
+    else:
+        bucket = None
+        query = select(*[getattr(model, c) for c in columns])
+    if start is not None:
+        query = query.where(model.timestamp >= start)
+    if end is not None:
+        query = query.where(model.timestamp <= end)
+    if bucket is not None:
+        return query.group_by(bucket).order_by(bucket)
+    return query.order_by(model.timestamp)
+
+
+def iter_chunks(query):
+    """Yield lists of row tuples, EXPORT_CHUNK_ROWS at a time, without loading the full result."""
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+
+def _column_rows(columns, aggregate=None, weights=None, stored=None):
+    """Row tuples from load_sensor_columns() output, shaped like the rows of build_query('sensor').
+
+    With weights, bucket averages weight each sample by it, falling back to a plain average in
+    buckets whose samples all weigh 0; data_points then counts the `stored` timestamps.
+    """
+    fields = [name for name in columns if name != 'timestamp']
+    if not aggregate:
+        values = [[None if v != v else v for v in columns[name].tolist()] for name in fields]  # NaN -> None
+        return list(zip(columns['timestamp'].astype('datetime64[us]').tolist(), *values))
+    unit = f'datetime64[{AGGREGATE_UNITS[aggregate]}]'
+    buckets, bucket_index, counts = np.unique(columns['timestamp'].astype(unit), return_inverse=True,
+                                              return_counts=True)
+    if stored is not None:
+        # Every stored row is also a sample, so its bucket exists
+        counts = np.bincount(np.searchsorted(buckets, stored.astype(unit)), minlength=len(buckets))
+    averages = []
+    for name in fields:
+        # Like SQL AVG(): missing values are skipped, and a bucket with none averages to NULL
+        valid = np.isfinite(columns[name])
+        values = np.where(valid, columns[name], 0)
+        sums = np.bincount(bucket_index, weights=values, minlength=len(buckets))
+        present = np.bincount(bucket_index, weights=valid, minlength=len(buckets))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = np.where(present > 0, sums / present, np.nan)
+            if weights is not None:
+                weighted = np.bincount(bucket_index, weights=values * weights, minlength=len(buckets))
+                duration = np.bincount(bucket_index, weights=valid * weights, minlength=len(buckets))
+                average = np.where(duration > 0, weighted / duration, average)
+        averages.append([None if v != v else v for v in average.tolist()])
+    return list(zip(buckets.astype('datetime64[us]').tolist(), *averages, counts.tolist()))
+
+
+def _reconstructed_rows(start, end, aggregate):
+    """Bucket averages over [start, end] with ingest compression on, as /api/history and /api/analytics
+    see the data: stored rows are filled in by reconstruct() and each sample is weighted by how long
+    it was current. Must be called inside an app context."""
+    # Load a little either side so the fill across start and end uses the rows beyond them
+    margin = timedelta(seconds=COMPRESSION_MAX_INTERVAL)
+    stored = load_sensor_columns(start - margin, end + margin)
+    columns = reconstruct(stored, until=min(end + margin, get_accurate_time()))
+    seconds = (columns['timestamp'] - np.datetime64(start, 'us')) / np.timedelta64(1, 's')
+    gaps = np.diff(seconds, append=seconds[-1] if len(seconds) else 0)
+    weights = np.where(gaps <= MAX_SAMPLE_SECONDS, gaps, 0)
+    inside = (columns['timestamp'] >= np.datetime64(start, 'us')) & (columns['timestamp'] <= np.datetime64(end, 'us'))
+    stored_inside = (stored['timestamp'] >= np.datetime64(start, 'us')) & (stored['timestamp'] <= np.datetime64(end, 'us'))
+    return _column_rows({name: array[inside] for name, array in columns.items()}, aggregate,
+                        weights=weights[inside], stored=stored['timestamp'][stored_inside])
+
+
+def iter_reconstructed_chunks(start=None, end=None, aggregate='hour'):
+    """Yield time-weighted bucket averages of reconstructed sensor data, a day at a time."""
+    first = first_reading_day()
+    if first is None:
+        return
+    end = end if end is not None else get_accurate_time()
+    day = datetime.combine(max(start.date(), first) if start is not None else first, time.min)
+    pending = []
+    while day <= end:
+        # Days never span buckets, so each day can be aggregated on its own
+        day_end = min(day + timedelta(days=1) - timedelta(microseconds=1), end)
+        pending.extend(_reconstructed_rows(max(day, start) if start else day, day_end, aggregate))
+        if len(pending) >= EXPORT_CHUNK_ROWS:
+            yield pending
+            pending = []
+        day += timedelta(days=1)
+    if pending:
+        yield pending
+
+
+def iter_sensor_chunks(start=None, end=None, aggregate=None):
+    """Yield sensor rows in chunks: archived months a day at a time (merged with any late rows still in
+    SQLite), then the rest straight from SQLite. Must be called inside an app context.
+
+    With ingest compression on, an average of the stored rows alone would be biased towards periods
+    of change, so aggregated exports are computed from reconstructed data instead.
+    """
+    if aggregate and COMPRESSION_MODE != 'off':
+        yield from iter_reconstructed_chunks(start, end, aggregate)
+        return
+    months = archived_months()
+    if months:
+        first = datetime.fromisoformat(months[0]['first'])
+        split = datetime.strptime(months[-1]['month'], '%Y-%m') + relativedelta(months=1)
+        last = split - timedelta(microseconds=1)
+        if end is not None:
+            last = min(last, end)
+        day = datetime.combine(max(start, first).date() if start is not None else first.date(), time.min)
+        pending = []
+        while day <= last:
+            # Days never span months or buckets, so each day can be read and aggregated on its own
+            day_end = min(day + timedelta(days=1) - timedelta(microseconds=1), last)
+            pending.extend(_column_rows(load_sensor_columns(max(day, start) if start else day, day_end), aggregate))
+            if len(pending) >= EXPORT_CHUNK_ROWS:
+                yield pending
+                pending = []
+            day += timedelta(days=1)
+        if pending:
+            yield pending
+        if start is None or start < split:
+            start = split
+    yield from iter_chunks(build_query('sensor', start, end, aggregate))
+
+
+def _normalize_timestamp(value):
+    # Aggregated rows carry the bucket as a string straight from strftime()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def encode_csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in chunks:
+        for row in chunk:
+            ts = _normalize_timestamp(row[0])
+            writer.writerow((ts.isoformat() if ts else '',) + row[1:])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def encode_ndjson(columns, chunks):
+    for chunk in chunks:
+        lines = []
+        for row in chunk:
+            record = dict(zip(columns, row))
+            ts = _normalize_timestamp(record['timestamp'])
+            record['timestamp'] = ts.isoformat() if ts else None
+            lines.append(json.dumps(record))
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class _ChunkSink:
+    """Minimal writable file that hands buffered bytes back to a generator."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_available():
+    # find_spec() checks for the optional dependency without paying for importing it
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _arrow_type(pa, column_type):
+    if isinstance(column_type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    return pa.string()
+
+
+def encode_parquet(columns, chunks, types):
+    # pyarrow is slow to import, so only load it when a Parquet export actually runs
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    # The schema comes from the model, not the first chunk: a column that is all NULL in one chunk
+    # (e.g. zone_id on old watering rows) must not change type in a later one
+    schema = pa.schema([(name, _arrow_type(pa, column_type)) for name, column_type in zip(columns, types)])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        if not chunk:
+            continue
+        arrays = list(zip(*chunk))
+        data = {name: list(values) for name, values in zip(columns, arrays)}
+        data['timestamp'] = [_normalize_timestamp(ts) for ts in data['timestamp']]
+        # Each chunk becomes one row group, flushed to the client as soon as it is written
+        writer.write_table(pa.table(data, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+    'parquet': encode_parquet,
+}
+
+
+def gzip_stream(parts):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def generate_export(table, fmt, start=None, end=None, aggregate=None, compress=False):
+    """Return a generator of encoded bytes for an export. Must be consumed inside an app context."""
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(ENCODERS)}")
+    if fmt == 'parquet' and not parquet_available():
+        raise ValueError('Parquet export requires pyarrow (pip install pyarrow)')
+    query = build_query(table, start, end, aggregate)
+    chunks = iter_sensor_chunks(start, end, aggregate) if table == 'sensor' else iter_chunks(query)
+    columns = export_columns(table, aggregate)
+    if fmt == 'parquet':
+        parts = encode_parquet(columns, chunks, export_column_types(table, aggregate))
+    else:
+        parts = ENCODERS[fmt](columns, chunks)
+    return gzip_stream(parts) if compress else parts
+
+
+def export_filename(table, fmt, aggregate=None, compress=False):
+    name = f"auto_farm_{table}"
+    if aggregate:
+        name += f"_{aggregate}"
+    name += f"_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[fmt][1]}"
+    return name + '.gz' if compress else name
+
+
+def main():
+    from flask import Flask
+    from config import DATABASE_URI
+
+    parser = argparse.ArgumentParser(description='Export auto-farm history to CSV, NDJSON or Parquet')
+    parser.add_argument('table', choices=sorted(EXPORT_TABLES), help='Which data to export')
+    parser.add_argument('--start', type=str, help='Start of range (ISO format, default: oldest record)')
+    parser.add_argument('--end', type=str, help='End of range (ISO format, default: newest record)')
+    parser.add_argument('--format', '-f', choices=sorted(ENCODERS), default='csv', help='Output format (default: csv)')
+    parser.add_argument('--aggregate', '-a', choices=list(AGGREGATE_BUCKETS), help='Average sensor data per minute/hour/day')
+    parser.add_argument('--gzip', '-z', action='store_true', help='Gzip-compress the output')
+    parser.add_argument('--output', '-o', type=str, help='Output file (default: stdout)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    db.init_app(app)
+
+    try:
+        with app.app_context():
+            parts = generate_export(args.table, args.format, parse_timestamp(args.start), parse_timestamp(args.end),
+                                    args.aggregate, args.gzip)
+            out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+            try:
+                written = 0
+                for part in parts:
+                    out.write(part)
+                    written += len(part)
+            finally:
+                if args.output:
+                    out.close()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.output:
+        print(f"Wrote {written} bytes to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+images.py - Maintenance of captured camera images
+Drops near-identical consecutive frames (perceptual hash), re-encodes old images at a lower
+quality or as WebP, and deletes the oldest images above a disk quota. Progress, removed
+duplicates and statistics are kept in <folder>/maintenance.json.
+
+Usage:
+  python images.py            # run one maintenance pass over camera_images/
+  python images.py --stats    # show image statistics
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from config import (IMAGE_DEDUP_DISTANCE, IMAGE_DEDUP_WINDOW, IMAGE_REENCODE_AFTER_DAYS, IMAGE_REENCODE_FORMAT,
+                    IMAGE_REENCODE_QUALITY, IMAGE_QUOTA_MB, get_accurate_time)
+
+IMAGE_EXTENSIONS = ('.jpg', '.webp')
+INDEX_NAME = 'maintenance.json'
+SETTLE_SECONDS = 60  # Newer files may still be being written, leave them for the next run
+MIMETYPES = {'.jpg': 'image/jpeg', '.webp': 'image/webp'}
+
+
+def list_images(folder):
+    """Image filenames in capture order (names start with the capture time)."""
+    if not os.path.isdir(folder):
+        return []
+    return sorted(f for f in os.listdir(folder) if f.endswith(IMAGE_EXTENSIONS))
+
+
+def image_time(folder, filename):
+    try:
+        return datetime.strptime(filename[:15], '%Y%m%d_%H%M%S')
+    except ValueError:
+        return datetime.fromtimestamp(os.path.getmtime(os.path.join(folder, filename)))
+
+
+def mimetype(filename):
+    return MIMETYPES.get(os.path.splitext(filename)[1], 'application/octet-stream')
+
+
+def load_index(folder):
+    path = os.path.join(folder, INDEX_NAME)
+    index = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            index = json.load(f)
+    index.setdefault('duplicates', {})  # kept filename -> filenames of the near-duplicates removed
+    index.setdefault('dedup', {'checked_through': '', 'last_kept': None, 'last_hash': None})
+    index.setdefault('reencoded_through', '')
+    index.setdefault('stats', {'duplicates_removed': 0, 'duplicate_bytes_freed': 0, 'reencoded': 0,
+                               'reencode_bytes_saved': 0, 'evicted': 0, 'evicted_bytes': 0, 'last_run': None})
+    return index
+
+
+def _save_index(folder, index):
+    path = os.path.join(folder, INDEX_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def perceptual_hash(path):
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail."""
+    from PIL import Image
+    with Image.open(path) as img:
+        pixels = list(img.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def deduplicate(folder, index, distance=IMAGE_DEDUP_DISTANCE, window=IMAGE_DEDUP_WINDOW):
+    """Delete frames that look like the last kept frame and were taken within `window` seconds of it.
+
+    The removed filenames (which carry the trigger/watering label) are listed under the kept frame.
+    """
+    state = index['dedup']
+    settled = time.time() - SETTLE_SECONDS
+    for name in list_images(folder):
+        if name <= state['checked_through']:
+            continue
+        path = os.path.join(folder, name)
+        if os.path.getmtime(path) > settled:
+            break
+        try:
+            value = perceptual_hash(path)
+        except Exception as e:
+            print(f'[Images] Could not hash {name}: {e}')
+            state['checked_through'] = name
+            continue
+        kept = state['last_kept']
+        if (kept and os.path.exists(os.path.join(folder, kept))
+                and (image_time(folder, name) - image_time(folder, kept)).total_seconds() <= window
+                and bin(value ^ int(state['last_hash'], 16)).count('1') <= distance):
+            size = os.path.getsize(path)
+            os.remove(path)
+            index['duplicates'].setdefault(kept, []).append(name)
+            index['stats']['duplicates_removed'] += 1
+            index['stats']['duplicate_bytes_freed'] += size
+        else:
+            state['last_kept'], state['last_hash'] = name, f'{value:016x}'
+        state['checked_through'] = name
+
+
+def reencode(folder, index, now, after_days=IMAGE_REENCODE_AFTER_DAYS, fmt=IMAGE_REENCODE_FORMAT,
+             quality=IMAGE_REENCODE_QUALITY):
+    """Re-encode images older than after_days, keeping the result only when it is smaller."""
+    from PIL import Image
+    cutoff = now - timedelta(days=after_days)
+    ext = '.webp' if fmt == 'webp' else '.jpg'
+    for name in list_images(folder):
+        if name <= index['reencoded_through']:
+            continue
+        if image_time(folder, name) >= cutoff:
+            break
+        path = os.path.join(folder, name)
+        new_name = os.path.splitext(name)[0] + ext
+        tmp_path = os.path.join(folder, new_name + '.tmp')
+        try:
+            with Image.open(path) as img:
+                img.convert('RGB').save(tmp_path, format=fmt.upper(), quality=quality)
+            old_size, new_size = os.path.getsize(path), os.path.getsize(tmp_path)
+            if new_size < old_size:
+                os.replace(tmp_path, os.path.join(folder, new_name))
+                if new_name != name:
+                    os.remove(path)
+                    if name in index['duplicates']:
+                        index['duplicates'][new_name] = index['duplicates'].pop(name)
+                    if index['dedup']['last_kept'] == name:
+                        index['dedup']['last_kept'] = new_name
+                index['stats']['reencoded'] += 1
+                index['stats']['reencode_bytes_saved'] += old_size - new_size
+            else:
+                os.remove(tmp_path)
+                new_name = name
+        except Exception as e:
+            print(f'[Images] Could not re-encode {name}: {e}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            new_name = name
+        index['reencoded_through'] = max(new_name, name)
+
+
+def enforce_quota(folder, index, quota_mb=IMAGE_QUOTA_MB):
+    """Delete the oldest images until the folder is within quota_mb."""
+    if not quota_mb:
+        return
+    files = [(name, os.path.getsize(os.path.join(folder, name))) for name in list_images(folder)]
+    total = sum(size for _, size in files)
+    limit = quota_mb * 1024 * 1024
+    for name, size in files:
+        if total <= limit:
+            break
+        os.remove(os.path.join(folder, name))
+        index['duplicates'].pop(name, None)
+        index['stats']['evicted'] += 1
+        index['stats']['evicted_bytes'] += size
+        total -= size
+
+
+def run_maintenance(folder):
+    """One maintenance pass: dedup, re-encode, quota. Returns the updated statistics."""
+    index = load_index(folder)
+    try:
+        deduplicate(folder, index)
+        reencode(folder, index, get_accurate_time())
+        enforce_quota(folder, index)
+    finally:
+        index['stats']['last_run'] = get_accurate_time().isoformat()
+        _save_index(folder, index)
+    return image_stats(folder, index)
+
+
+def image_stats(folder, index=None):
+    """Current image count and size plus what maintenance has removed or saved so far."""
+    index = index or load_index(folder)
+    files = list_images(folder)
+    return {
+        'image_count': len(files),
+        'image_size': sum(os.path.getsize(os.path.join(folder, name)) for name in files),
+        'quota_size': IMAGE_QUOTA_MB * 1024 * 1024,
+        **index['stats']
+    }
+
+
+def resolve_image(folder, filename, index=None):
+    """The file that now holds `filename`: itself, its re-encoded copy, or the frame it duplicated."""
+    if os.path.exists(os.path.join(folder, filename)):
+        return filename
+    stem = os.path.splitext(filename)[0]
+    for ext in IMAGE_EXTENSIONS:
+        if os.path.exists(os.path.join(folder, stem + ext)):
+            return stem + ext
+    index = index or load_index(folder)
+    for kept, removed in index['duplicates'].items():
+        if filename in removed:
+            return kept
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deduplicate, re-encode and cap auto-farm camera images')
+    parser.add_argument('--folder', default='camera_images', help='Image folder (default: camera_images)')
+    parser.add_argument('--stats', action='store_true', help='Show statistics and exit')
+    args = parser.parse_args()
+    if args.stats:
+        print(image_stats(args.folder))
+        return 0
+    print(run_maintenance(args.folder))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
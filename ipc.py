@@ -0,0 +1,113 @@
+# auto-farm local command channel between the web tier and the ingest daemon
+import os
+import secrets
+import threading
+from multiprocessing.connection import Client, Listener
+
+from config import IPC_HOST, IPC_PORT, IPC_KEY_FILE
+
+# The key this channel shipped with; anyone can read it, so it is refused
+DEFAULT_AUTHKEY = b'auto-farm'
+
+
+class DaemonUnavailable(Exception):
+    """Raised when the ingest daemon cannot be reached or does not answer in time."""
+
+
+def load_authkey(create=False):
+    """The shared IPC key: AUTO_FARM_IPC_KEY, else IPC_KEY_FILE (generated when create=True).
+
+    The key is all that stands between local users and the daemon (messages are pickled), so a
+    missing, default or group/world-readable key raises RuntimeError.
+    """
+    key = os.environ.get('AUTO_FARM_IPC_KEY', '').encode()
+    if not key:
+        if create and not os.path.exists(IPC_KEY_FILE):
+            os.makedirs(os.path.dirname(IPC_KEY_FILE) or '.', exist_ok=True)
+            fd = os.open(IPC_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+            print(f"[IPC] Generated a new key in {IPC_KEY_FILE}")
+        if not os.path.exists(IPC_KEY_FILE):
+            raise RuntimeError(f"No IPC key: start the daemon first or set AUTO_FARM_IPC_KEY ({IPC_KEY_FILE} missing)")
+        if os.name == 'posix' and os.stat(IPC_KEY_FILE).st_mode & 0o077:
+            raise RuntimeError(f"{IPC_KEY_FILE} is readable by other users, run: chmod 600 {IPC_KEY_FILE}")
+        with open(IPC_KEY_FILE, 'rb') as f:
+            key = f.read().strip()
+    if len(key) < 16 or key == DEFAULT_AUTHKEY:
+        raise RuntimeError('Refusing to use a short or default IPC key; delete it to have a new one generated')
+    return key
+
+
+class CommandServer:
+    """Accepts {'action': ..., **kwargs} messages on localhost and dispatches them to handlers.
+
+    Each handler receives the message's keyword arguments and returns a picklable result.
+    """
+
+    def __init__(self, handlers, address=(IPC_HOST, IPC_PORT), authkey=None):
+        self.handlers = handlers
+        self.listener = Listener(address, authkey=authkey or load_authkey(create=True))
+        self._thread = None
+        self._closing = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        print(f"[IPC] Listening on {self.listener.address[0]}:{self.listener.address[1]}")
+
+    def close(self):
+        self._closing = True
+        self.listener.close()
+
+    def _accept_loop(self):
+        while not self._closing:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                if self._closing:
+                    return
+                continue
+            except Exception as e:
+                # Bad authkey or a client that hung up mid-handshake
+                print(f"[IPC] Rejected connection: {e}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            message = conn.recv()
+            action = message.pop('action', None)
+            handler = self.handlers.get(action)
+            if handler is None:
+                conn.send({'status': 'error', 'message': f'Unknown action: {action}'})
+                return
+            try:
+                conn.send({'status': 'ok', 'result': handler(**message)})
+            except Exception as e:
+                print(f"[IPC] Error handling '{action}': {e}")
+                conn.send({'status': 'error', 'message': str(e)})
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+
+def call(action, timeout=10, **kwargs):
+    """Send one command to the daemon and return its result. Raises DaemonUnavailable."""
+    try:
+        conn = Client((IPC_HOST, IPC_PORT), authkey=load_authkey())
+    except Exception as e:
+        raise DaemonUnavailable(f"Ingest daemon not reachable on {IPC_HOST}:{IPC_PORT}: {e}")
+    try:
+        conn.send({'action': action, **kwargs})
+        if not conn.poll(timeout):
+            raise DaemonUnavailable(f"Ingest daemon did not answer '{action}' within {timeout}s")
+        reply = conn.recv()
+    except (EOFError, OSError) as e:
+        raise DaemonUnavailable(f"Lost connection to ingest daemon: {e}")
+    finally:
+        conn.close()
+    if reply['status'] != 'ok':
+        raise RuntimeError(reply.get('message', 'Daemon error'))
+    return reply['result']
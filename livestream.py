@@ -0,0 +1,190 @@
+# auto-farm live view: one capture thread encodes each frame once for every viewer
+import threading
+import time
+
+from config import LIVE_FPS, LIVE_WIDTH, LIVE_JPEG_QUALITY, LIVE_IDLE_SECONDS
+
+BOUNDARY = 'frame'
+
+
+class LiveStream:
+    """Shares the webcam between the MJPEG live view and still captures.
+
+    A producer thread starts with the first viewer and stops LIVE_IDLE_SECONDS after the last one
+    leaves, releasing the camera. It keeps only the newest frame: a viewer that is slower than the
+    frame rate gets the newest frame when it is ready again and the ones in between are dropped.
+    With remote set (web role) frames are pulled from the ingest daemon, which owns the camera,
+    instead: remote(after) returns (seq, jpeg) like next_frame().
+    """
+
+    def __init__(self, camera_index, stop_event, remote=None, fps=LIVE_FPS, width=LIVE_WIDTH,
+                 quality=LIVE_JPEG_QUALITY, idle_seconds=LIVE_IDLE_SECONDS):
+        self.camera_index = camera_index  # Callable, so --camera-index applies after import
+        self.stop_event = stop_event
+        self.remote = remote
+        self.fps = fps
+        self.width = width
+        self.quality = quality
+        self.idle_seconds = idle_seconds
+        self.device_lock = threading.Lock()  # Held while this process has the webcam open
+        self.error = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._seq = 0
+        self._jpeg = None
+        self._raw = None
+        self._viewers = 0
+        self._last_demand = 0.0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def _running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _demand(self):
+        """Note that someone wants frames and start the producer if needed. Call with _cond held."""
+        self._last_demand = time.monotonic()
+        if not self._running():
+            self.error = None
+            self._thread = threading.Thread(target=self._run_remote if self.remote else self._run,
+                                            name='live_stream', daemon=True)
+            self._thread.start()
+
+    def _idle(self):
+        with self._cond:
+            unwatched = self._viewers == 0 and time.monotonic() - self._last_demand > self.idle_seconds
+        return unwatched or self.stop_event.is_set()
+
+    def _publish(self, jpeg, raw=None):
+        with self._cond:
+            self._seq += 1
+            self._jpeg = jpeg
+            self._raw = raw
+            self._cond.notify_all()
+
+    def _run(self):
+        import cv2
+        with self.device_lock:
+            cap = cv2.VideoCapture(self.camera_index())
+            try:
+                if not cap.isOpened():
+                    self.error = 'Could not open webcam'
+                    print(f'[Live] {self.error}')
+                    return
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Always read a current frame, not a queued one
+                print('[Live] Webcam opened for live view')
+                failures = 0
+                while not self._idle():
+                    started = time.monotonic()
+                    ok, frame = cap.read()
+                    if not ok:
+                        failures += 1
+                        if failures >= 10:
+                            self.error = 'Webcam stopped delivering frames'
+                            print(f'[Live] {self.error}')
+                            return
+                        continue
+                    failures = 0
+                    small = frame
+                    if frame.shape[1] > self.width:
+                        height = int(frame.shape[0] * self.width / frame.shape[1])
+                        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+                    ok, encoded = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                    if ok:
+                        self._publish(encoded.tobytes(), frame)
+                    self.stop_event.wait(max(0.0, 1 / self.fps - (time.monotonic() - started)))
+            finally:
+                cap.release()
+                with self._cond:
+                    self._jpeg = self._raw = None
+                    self._cond.notify_all()
+                print('[Live] Webcam released')
+
+    def _run_remote(self):
+        after = 0
+        try:
+            while not self._idle():
+                try:
+                    after, jpeg = self.remote(after)
+                except Exception as e:
+                    self.error = str(e)
+                    print(f'[Live] {e}')
+                    return
+                if jpeg is not None:
+                    self._publish(jpeg)
+        finally:
+            with self._cond:
+                self._jpeg = None
+                self._cond.notify_all()
+
+    def next_frame(self, after, timeout=5.0):
+        """The newest encoded frame newer than sequence number `after`, as (seq, jpeg); jpeg is None on timeout."""
+        with self._cond:
+            self._demand()
+            self._cond.wait_for(lambda: (self._seq > after and self._jpeg is not None) or not self._running(),
+                                timeout)
+            if self._seq > after and self._jpeg is not None:
+                return self._seq, self._jpeg
+            return after, None
+
+    def frames(self, fps=None):
+        """Multipart MJPEG body for one viewer, optionally throttled to a lower fps."""
+        with self._cond:
+            self._viewers += 1
+            self._demand()
+        seq = 0
+        try:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                new_seq, jpeg = self.next_frame(seq)
+                if jpeg is None:
+                    if self.error and not self._running():
+                        return
+                    continue
+                if seq:
+                    self.frames_dropped += new_seq - seq - 1
+                seq = new_seq
+                self.frames_sent += 1
+                # Blocks while the client is slow to read; meanwhile only the newest frame is kept
+                yield (f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n'
+                       .encode() + jpeg + b'\r\n')
+                if fps:
+                    time.sleep(max(0.0, 1 / fps - (time.monotonic() - started)))
+        finally:
+            with self._cond:
+                self._viewers -= 1
+                self._last_demand = time.monotonic()
+
+    def capture_still(self, timeout=5.0):
+        """One full-resolution BGR frame for a still capture, or None if the webcam is unavailable.
+
+        Uses the live view's current frame while it is running, otherwise opens the webcam briefly.
+        """
+        import cv2
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                if self._running():
+                    seq = self._seq
+                    self._cond.wait_for(lambda: self._seq > seq or not self._running(), 1.0)
+                    if self._seq > seq and self._raw is not None:
+                        return self._raw.copy()
+                    continue
+            if self.device_lock.acquire(timeout=0.5):
+                try:
+                    cap = cv2.VideoCapture(self.camera_index())
+                    try:
+                        if not cap.isOpened():
+                            return None
+                        ok, frame = cap.read()
+                        return frame if ok else None
+                    finally:
+                        cap.release()
+                finally:
+                    self.device_lock.release()
+        return None
+
+    def status(self):
+        with self._cond:
+            return {'running': self._running(), 'viewers': self._viewers, 'frames_sent': self.frames_sent,
+                    'frames_dropped': self.frames_dropped, 'error': self.error}
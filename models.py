@@ -5,7 +5,7 @@ db = SQLAlchemy()
 
 class SensorData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     temp_f = db.Column(db.Float)
     fan_signal = db.Column(db.Float)
     hydrometer_a = db.Column(db.Float)
@@ -13,22 +13,52 @@ class SensorData(db.Model):
     humidity = db.Column(db.Float)
 
 class TriggerLog(db.Model):
+    """A trigger's state, logged when it changes (older databases have one row per reading)."""
+    __table_args__ = (db.Index('ix_trigger_log_name_timestamp', 'trigger_name', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     trigger_name = db.Column(db.String(100))
     active = db.Column(db.Boolean, default=False)
 
 class WateringSchedule(db.Model):
-    """Singleton row (id=1) storing the active watering schedule config."""
+    """One row per watering zone (valve) with its schedule; id=1 is the original valve (W1/W0)."""
     id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), default='Zone 1')
     enabled = db.Column(db.Boolean, default=True)
     duration_seconds = db.Column(db.Float, default=2.0)
-    interval_hours = db.Column(db.Float, default=8.0)
+    interval_hours = db.Column(db.Float, default=8.0)  # 0: no timed watering, moisture only
     last_watered = db.Column(db.DateTime, nullable=True)
+    open_command = db.Column(db.String(20), default='W1')
+    close_command = db.Column(db.String(20), default='W0')
+    moisture_sensor = db.Column(db.String(20), nullable=True)  # 'hydrometer_a', 'hydrometer_b' or None
+    moisture_threshold = db.Column(db.Float, nullable=True)    # Water when the sensor reads at or below this
+    moisture_cooldown_minutes = db.Column(db.Float, default=60.0)
 
 class WateringLog(db.Model):
     """Record of every completed watering cycle."""
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     duration_seconds = db.Column(db.Float)
-    triggered_by = db.Column(db.String(50))  # 'schedule' or 'manual'
\ No newline at end of file
+    triggered_by = db.Column(db.String(50))  # 'schedule', 'moisture' or 'manual'
+    zone_id = db.Column(db.Integer, nullable=True)
+
+class DailySummary(db.Model):
+    """Climate analytics for one closed day, computed once by analytics.py and reused."""
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, unique=True, index=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    readings = db.Column(db.Integer)
+    covered_hours = db.Column(db.Float)           # Hours of the day with sensor data
+    avg_temp_f = db.Column(db.Float)
+    min_temp_f = db.Column(db.Float)
+    max_temp_f = db.Column(db.Float)
+    avg_humidity = db.Column(db.Float)
+    avg_vpd_kpa = db.Column(db.Float)             # Vapor pressure deficit
+    max_vpd_kpa = db.Column(db.Float)
+    degree_hours = db.Column(db.Float)            # °F above TARGET_TEMP_F integrated over time
+    humidity_low_hours = db.Column(db.Float)      # Below TARGET_HUMIDITY - HUMIDITY_RANGE
+    humidity_high_hours = db.Column(db.Float)     # Above TARGET_HUMIDITY + HUMIDITY_RANGE
+    fan_duty_cycle = db.Column(db.Float)          # Fraction of covered time with the fan on
+    avg_fan_signal = db.Column(db.Float)
+    hydrometer_a_drying_rate = db.Column(db.Float)  # % per hour, averaged over hours without watering
+    hydrometer_b_drying_rate = db.Column(db.Float)
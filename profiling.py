@@ -0,0 +1,258 @@
+# auto-farm request profiling (opt-in, enabled with --profile)
+import cProfile
+import os
+import pstats
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from flask import g, has_app_context, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from config import SLOW_QUERY_MS, PROFILE_FOLDER
+
+_capture_lock = threading.Lock()
+_capture = {'route': None, 'remaining': 0, 'stats': None, 'captured': 0, 'last_dump': None}
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records serialization time against the current request."""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if has_app_context() and 'profile_start' in g:
+                g.profile_json += time.perf_counter() - start
+
+
+def _profiling_request():
+    return has_app_context() and 'profile_start' in g
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """Cursor that also times fetching: SQLite produces rows during fetch, not execute.
+
+    The slow-query check runs on close, once execute and fetch time are both known.
+    """
+    profile_query = None  # [statement, parameters, executemany, seconds] of the current statement
+
+    def _timed(self, fetch, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fetch(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.profile_query is not None:
+                self.profile_query[3] += elapsed
+            if _profiling_request():
+                g.profile_sql += elapsed
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(super().fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def close(self):
+        query, self.profile_query = self.profile_query, None
+        if query is not None:
+            _check_slow_query(self, *query)
+        super().close()
+
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+
+def _do_connect(dialect, conn_rec, cargs, cparams):
+    # Open SQLite connections with the timing cursor; other databases keep their default connect
+    if dialect.name != 'sqlite' or 'factory' in cparams:
+        return None
+    return dialect.loaded_dbapi.connect(*cargs, factory=_TimedConnection, **cparams)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if _profiling_request():
+        g.profile_sql += elapsed
+        g.profile_queries += 1
+    if isinstance(cursor, _TimedCursor):
+        cursor.profile_query = [statement, parameters, executemany, elapsed]
+    else:
+        _check_slow_query(cursor, statement, parameters, executemany, elapsed)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    if context.statement is not None and context.connection is not None:
+        starts = context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+
+def _do_orm_execute(state):
+    """Time ORM hydration (turning rows into objects) apart from SQL and the view's own Python.
+
+    The result is buffered so hydration happens here; streamed (yield_per) results are left alone
+    and their hydration counts as Python time.
+    """
+    if (not _profiling_request() or g.profile_in_orm or not state.is_select
+            or state.execution_options.get('yield_per') or state.execution_options.get('stream_results')):
+        return None
+    g.profile_in_orm = True
+    start = time.perf_counter()
+    sql_before = g.profile_sql
+    try:
+        frozen = state.invoke_statement().freeze()
+    finally:
+        g.profile_in_orm = False
+        g.profile_orm += max(0.0, time.perf_counter() - start - (g.profile_sql - sql_before))
+    return frozen()
+
+
+def _check_slow_query(cursor, statement, parameters, executemany, elapsed):
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        print(f"[Slow Query] {elapsed * 1000:.1f}ms: {statement.strip()} params={parameters!r}")
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            for line in explain_query_plan(cursor, statement, parameters):
+                print(f"[Slow Query]   {line}")
+
+
+def explain_query_plan(cursor, statement, parameters):
+    """Return the SQLite EXPLAIN QUERY PLAN rows for a statement as readable strings."""
+    try:
+        plan = cursor.connection.cursor()
+        try:
+            plan.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            return [row[-1] for row in plan.fetchall()]
+        finally:
+            plan.close()
+    except Exception as e:
+        return [f"(could not explain: {e})"]
+
+
+def arm_capture(route, count):
+    """Profile the next `count` requests to `route` with cProfile and dump the combined stats."""
+    with _capture_lock:
+        _capture.update(route=route, remaining=count, stats=None, captured=0)
+    print(f"[Profile] Capturing next {count} request(s) to {route}")
+
+
+def capture_status():
+    with _capture_lock:
+        return {
+            'route': _capture['route'],
+            'remaining': _capture['remaining'],
+            'captured': _capture['captured'],
+            'last_dump': _capture['last_dump'],
+        }
+
+
+def _claim_capture_slot():
+    with _capture_lock:
+        if _capture['remaining'] > 0 and request.path == _capture['route']:
+            _capture['remaining'] -= 1
+            return True
+    return False
+
+
+def _store_capture(profiler):
+    with _capture_lock:
+        if _capture['stats'] is None:
+            _capture['stats'] = pstats.Stats(profiler)
+        else:
+            _capture['stats'].add(profiler)
+        _capture['captured'] += 1
+        if _capture['remaining'] > 0:
+            return
+        if not os.path.exists(PROFILE_FOLDER):
+            os.makedirs(PROFILE_FOLDER)
+        route_str = _capture['route'].strip('/').replace('/', '_') or 'index'
+        filename = datetime.now().strftime("%Y%m%d_%H%M%S") + f"_{route_str}.pstats"
+        filepath = os.path.join(PROFILE_FOLDER, filename)
+        _capture['stats'].dump_stats(filepath)
+        _capture['stats'] = None
+        _capture['last_dump'] = filepath
+    print(f"[Profile] Wrote cProfile stats to {filepath} (inspect with: python -m pstats {filepath})")
+
+
+def init_profiling(app):
+    """Install per-request phase timing, the slow-query log and the capture endpoint."""
+    app.json = TimedJSONProvider(app)
+    event.listen(Engine, 'do_connect', _do_connect)
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    event.listen(Session, 'do_orm_execute', _do_orm_execute)
+
+    @app.before_request
+    def _profile_before():
+        g.profile_sql = 0.0
+        g.profile_queries = 0
+        g.profile_orm = 0.0
+        g.profile_in_orm = False
+        g.profile_json = 0.0
+        g.profile_cprofile = None
+        if _claim_capture_slot():
+            g.profile_cprofile = cProfile.Profile()
+            g.profile_cprofile.enable()
+        g.profile_start = time.perf_counter()
+
+    @app.after_request
+    def _profile_after(response):
+        if 'profile_start' not in g:
+            return response
+        total = time.perf_counter() - g.profile_start
+        if g.profile_cprofile is not None:
+            g.profile_cprofile.disable()
+            _store_capture(g.profile_cprofile)
+        # SQL covers executing statements and fetching their rows; the rest is the view's own Python work
+        python_time = max(0.0, total - g.profile_sql - g.profile_orm - g.profile_json)
+        response.headers['Server-Timing'] = (
+            f"sql;dur={g.profile_sql * 1000:.1f}, orm;dur={g.profile_orm * 1000:.1f}, "
+            f"python;dur={python_time * 1000:.1f}, json;dur={g.profile_json * 1000:.1f}, "
+            f"total;dur={total * 1000:.1f}"
+        )
+        if not request.path.startswith('/static/'):
+            print(f"[Profile] {request.method} {request.full_path.rstrip('?')} {response.status_code} "
+                  f"total={total * 1000:.1f}ms sql={g.profile_sql * 1000:.1f}ms ({g.profile_queries} queries) "
+                  f"orm={g.profile_orm * 1000:.1f}ms python={python_time * 1000:.1f}ms json={g.profile_json * 1000:.1f}ms "
+                  f"size={response.calculate_content_length() or 0}B")
+        return response
+
+    @app.route('/api/profile', methods=['GET'])
+    def get_profile_status():
+        return jsonify(capture_status())
+
+    @app.route('/api/profile', methods=['POST'])
+    def start_profile_capture():
+        """Arm a cProfile capture: {"route": "/api/history", "count": 5}"""
+        data = request.get_json(silent=True) or {}
+        route = data.get('route')
+        count = data.get('count', 1)
+        if not route or not route.startswith('/'):
+            return jsonify({'status': 'error', 'message': 'route must be a path such as /api/history'}), 400
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'count must be an integer'}), 400
+        if not 1 <= count <= 1000:
+            return jsonify({'status': 'error', 'message': 'count must be between 1 and 1000'}), 400
+        arm_capture(route, count)
+        return jsonify({'status': 'ok', **capture_status()})
+
+    print(f"[Profile] Request profiling enabled (slow query threshold: {SLOW_QUERY_MS}ms)")
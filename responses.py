@@ -0,0 +1,56 @@
+# auto-farm JSON responses with ETag revalidation and gzip/brotli compression
+import gzip
+import hashlib
+import importlib.util
+
+from flask import Response, current_app, request
+
+MIN_COMPRESS_BYTES = 1024   # Smaller bodies are not worth the CPU
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_brotli = None
+
+
+def _load_brotli():
+    # brotli is optional; import it on first use so startup does not pay for it
+    global _brotli
+    if _brotli is None and importlib.util.find_spec('brotli') is not None:
+        import brotli
+        _brotli = brotli
+    return _brotli
+
+
+def _negotiate_encoding():
+    offered = ['br', 'gzip'] if _load_brotli() else ['gzip']
+    for encoding in offered:
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def cached_json(payload, immutable=False):
+    """Build a JSON response with an ETag, answering 304 when the client already has this body.
+
+    immutable=True marks the body as never changing (e.g. a fully-past history range) so browsers
+    can reuse it without revalidating; otherwise clients must revalidate with If-None-Match.
+    """
+    body = current_app.json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    response = Response(body, mimetype='application/json')
+    # Weak ETag: the same JSON may be sent with different Content-Encodings
+    response.set_etag(hashlib.sha1(body).hexdigest(), weak=True)
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    response.make_conditional(request)
+    if response.status_code == 304 or len(body) < MIN_COMPRESS_BYTES:
+        return response
+    encoding = _negotiate_encoding()
+    if encoding == 'br':
+        response.set_data(_brotli.compress(body, quality=5))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=6))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,118 @@
+# auto-farm watering scheduler: sleeps until the next zone is due instead of polling
+import heapq
+import threading
+from datetime import timedelta
+
+RETRY_AFTER = timedelta(seconds=60)  # Delay before retrying a zone whose cycle failed or was busy
+
+
+class WateringScheduler:
+    """Timer heap of interval waterings per zone, plus soil-moisture triggered waterings.
+
+    load_zones() returns the current zone configs as dicts, run_cycle(zone, triggered_by) runs one
+    watering cycle and returns True on success, and clock() returns the current time. The heap is
+    rebuilt whenever wake() is called (schedule changed, a cycle finished, shutdown). A zone's
+    min_temp_f only gates moisture-triggered waterings; interval waterings run regardless.
+    """
+
+    def __init__(self, load_zones, run_cycle, is_busy, clock):
+        self.load_zones = load_zones
+        self.run_cycle = run_cycle
+        self.is_busy = is_busy
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._dirty = True
+        self._heap = []
+        self._zones = {}
+        self._not_before = {}
+
+    def wake(self):
+        """Reload zones and recompute due times on the scheduler thread."""
+        with self._cond:
+            self._dirty = True
+            self._cond.notify()
+
+    def _reload(self):
+        zones = {zone['id']: zone for zone in self.load_zones()}
+        now = self.clock()
+        heap = []
+        for zone in zones.values():
+            if not zone['enabled'] or not zone['interval_hours'] or self.is_busy(zone['id']):
+                # Busy zones are rescheduled when their running cycle calls wake()
+                continue
+            if zone['last_watered'] is None:
+                due = now
+            else:
+                due = zone['last_watered'] + timedelta(hours=zone['interval_hours'])
+            due = max(due, self._not_before.get(zone['id'], due))
+            heap.append((due, zone['id']))
+        heapq.heapify(heap)
+        self._zones = zones
+        self._heap = heap
+
+    def _dispatch(self, zone, triggered_by):
+        def job():
+            ok = False
+            try:
+                ok = self.run_cycle(zone, triggered_by)
+            finally:
+                with self._cond:
+                    if ok:
+                        self._not_before.pop(zone['id'], None)
+                    else:
+                        self._not_before[zone['id']] = self.clock() + RETRY_AFTER
+                    self.wake()
+        threading.Thread(target=job, name=f"watering_zone_{zone['id']}", daemon=True).start()
+
+    def notify_reading(self, reading):
+        """Called for every reading on the serial thread: start moisture-driven waterings whose threshold
+        is crossed (and whose min_temp_f is met)."""
+        now = self.clock()
+        # _not_before and the zone dicts are shared with the scheduler thread and finishing cycles
+        with self._cond:
+            for zone in self._zones.values():
+                sensor = zone['moisture_sensor']
+                if not zone['enabled'] or not sensor or zone['moisture_threshold'] is None:
+                    continue
+                value = reading.get(sensor)
+                if value is None or value > zone['moisture_threshold']:
+                    continue
+                if zone['min_temp_f'] is not None and (reading.get('temp_f') or 0) < zone['min_temp_f']:
+                    continue
+                last = zone['last_watered']
+                if last is not None and now - last < timedelta(minutes=zone['moisture_cooldown_minutes']):
+                    continue
+                if now < self._not_before.get(zone['id'], now) or self.is_busy(zone['id']):
+                    continue
+                # Start the cooldown now so the next readings do not dispatch the same zone again
+                zone['last_watered'] = now
+                print(f"[Watering Scheduler] {zone['name']}: {sensor}={value} <= {zone['moisture_threshold']}, watering")
+                self._dispatch(zone, 'moisture')
+
+    def run(self, stop_event, startup_delay=30):
+        stop_event.wait(startup_delay)  # Brief startup delay so serial has time to init
+        while not stop_event.is_set():
+            due_zone = None
+            with self._cond:
+                if self._dirty:
+                    self._dirty = False
+                    try:
+                        self._reload()
+                    except Exception as e:
+                        print(f'[Watering Scheduler] Error loading zones: {e}')
+                        self._heap = []
+                        self._dirty = True
+                        self._cond.wait(RETRY_AFTER.total_seconds())
+                        continue
+                if self._heap:
+                    due, zone_id = self._heap[0]
+                    delay = (due - self.clock()).total_seconds()
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        due_zone = self._zones[zone_id]
+                    else:
+                        self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+            if due_zone is not None:
+                self._dispatch(due_zone, 'schedule')
@@ -0,0 +1,257 @@
+# auto-farm reading journal: readings and trigger states are made durable on disk first and replayed into SQLite in bulk
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from archive import SENSOR_FIELDS
+from config import JOURNAL_PATH, JOURNAL_FSYNC_INTERVAL, JOURNAL_BATCH_ROWS
+from models import db, SensorData, TriggerLog
+
+# Journaled tables: model, value columns, and the columns identifying a row already stored
+TABLES = {
+    'sensor_data': (SensorData, SENSOR_FIELDS, ('timestamp',)),
+    'trigger_log': (TriggerLog, ['trigger_name', 'active'], ('timestamp', 'trigger_name')),
+}
+
+
+class ReadingJournal:
+    """Append-only file of rows for TABLES, one JSON line each with an increasing sequence number.
+
+    append() never touches the database; fsyncs are batched to one per fsync_interval. The sequence
+    number of the last row in SQLite is kept in <path>.checkpoint, and the file is truncated whenever
+    everything in it has been replayed.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, fsync_interval=JOURNAL_FSYNC_INTERVAL):
+        self.path = path
+        self.checkpoint_path = path + '.checkpoint'
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._last_fsync = 0.0
+        self._unsynced = False
+        self.seq = 0              # Last sequence number written
+        self.replayed_seq = 0     # Last sequence number replayed into SQLite
+        self.checkpoint = 0       # Byte offset of the first line not replayed yet
+        self.oldest_pending = None
+        self.replayed = 0
+        self.duplicates = 0
+
+    def open(self):
+        """Open the journal for appending, dropping a torn last line left by a crash."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(max(0, size - 65536))
+                tail = f.read()
+                if not tail.endswith(b'\n'):
+                    f.truncate(size - len(tail) + tail.rfind(b'\n') + 1)
+        state = _read_checkpoint(self.checkpoint_path)
+        self.seq = self.replayed_seq = state['seq']
+        self.checkpoint = _resume_offset(self.path, state['seq'], state['offset'])
+        pending = 0
+        for row in _read_lines(self.path, self.checkpoint):
+            if not pending:
+                self.oldest_pending = datetime.fromisoformat(row['timestamp'])
+                self.replayed_seq = max(self.replayed_seq, row['seq'] - 1)
+            self.seq = max(self.seq, row['seq'])
+            pending += 1
+        if pending:
+            print(f'[Journal] {pending} rows waiting to be replayed')
+        self._file = open(self.path, 'ab')
+
+    def append(self, rows, table='sensor_data'):
+        """Write rows for `table` (dicts with a datetime 'timestamp') to the journal."""
+        if not rows:
+            return
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError('Journal is not open')
+            for row in rows:
+                self.seq += 1
+                line = json.dumps({**row, 'seq': self.seq, 'table': table, 'timestamp': row['timestamp'].isoformat()})
+                self._file.write(line.encode() + b'\n')
+            if self.oldest_pending is None:
+                self.oldest_pending = rows[0]['timestamp']
+            self._file.flush()
+            self._unsynced = True
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+
+    def _fsync(self):
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+    def sync(self):
+        """fsync anything appended since the last fsync."""
+        with self._lock:
+            if self._file and self._unsynced:
+                self._fsync()
+
+    def read_pending(self, limit):
+        """Up to `limit` journaled rows after the checkpoint, and the offset just past them."""
+        rows = []
+        offset = self.checkpoint
+        for row, offset in _read_lines(self.path, self.checkpoint, with_offsets=True):
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+        return rows, offset
+
+    def commit(self, offset, seq):
+        """Record that everything before `offset` is in SQLite; truncate the file once it is all replayed."""
+        with self._lock:
+            if offset >= os.fstat(self._file.fileno()).st_size:
+                os.ftruncate(self._file.fileno(), 0)
+                offset = 0
+                self.oldest_pending = None
+            self.checkpoint = offset
+            self.replayed_seq = seq
+            # The offset is only a hint for the next open(); the sequence number is what counts
+            with open(self.checkpoint_path + '.tmp', 'w') as f:
+                json.dump({'offset': offset, 'seq': seq}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._fsync()
+                self._file.close()
+                self._file = None
+
+    def status(self, now):
+        """Backlog metrics: readings and bytes not yet in SQLite and how long the oldest has waited."""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {
+            'backlog': self.seq - self.replayed_seq,
+            'backlog_bytes': max(0, size - self.checkpoint),
+            'backlog_seconds': round(max((now - self.oldest_pending).total_seconds(), 0), 1) if self.oldest_pending else 0,
+            'replayed': self.replayed,
+            'duplicates_skipped': self.duplicates
+        }
+
+
+def _read_checkpoint(path):
+    state = {'offset': 0, 'seq': 0}
+    try:
+        with open(path) as f:
+            state.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        # Replaying from the start is safe: rows already stored are skipped
+        print(f'[Journal] Ignoring unreadable checkpoint {path}: {e}')
+    return state
+
+
+def _read_lines(path, offset=0, with_offsets=False):
+    """Yield the complete, parseable rows from offset on (with the offset just past each, if asked)."""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # Still being written
+            offset += len(line)
+            try:
+                row = json.loads(line)
+            except ValueError:
+                print(f'[Journal] Skipping unreadable line ending at byte {offset} of {path}')
+                continue
+            yield (row, offset) if with_offsets else row
+
+
+def _resume_offset(path, seq, hint=0):
+    """Byte offset of the first line with a sequence number above seq.
+
+    The offset saved with the checkpoint is only trusted when the line there starts right after a
+    newline and continues the sequence; otherwise (e.g. a stale checkpoint after a truncation) the
+    file is scanned from the start.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if hint > 0:
+                f.seek(hint - 1)
+                if f.read(1) == b'\n':
+                    try:
+                        if json.loads(f.readline())['seq'] == seq + 1:
+                            return hint
+                    except (ValueError, KeyError):
+                        pass
+    except FileNotFoundError:
+        return 0
+    offset = 0
+    for row, end in _read_lines(path, 0, with_offsets=True):
+        if row['seq'] > seq:
+            return offset
+        offset = end
+    return offset
+
+
+def oldest_unreplayed(path=JOURNAL_PATH):
+    """Timestamp of the oldest journaled row not yet in SQLite, or None. Only reads the files, so any
+    process (e.g. the web tier) can ask."""
+    state = _read_checkpoint(path + '.checkpoint')
+    for row in _read_lines(path, _resume_offset(path, state['seq'], state['offset'])):
+        return datetime.fromisoformat(row['timestamp'])
+    return None
+
+
+def _new_rows(table, rows):
+    """Rows of one table from a journal batch, minus those already stored."""
+    model, fields, key = TABLES[table]
+    rows = [{'timestamp': datetime.fromisoformat(row['timestamp']), **{f: row[f] for f in fields}} for row in rows]
+    start = min(row['timestamp'] for row in rows)
+    end = max(row['timestamp'] for row in rows)
+    columns = [getattr(model, name) for name in key]
+    existing = set(db.session.execute(
+        select(*columns).where(model.timestamp >= start, model.timestamp <= end)
+    ).all())
+    return [row for row in rows if tuple(row[name] for name in key) not in existing]
+
+
+def replay(journal, limit=JOURNAL_BATCH_ROWS):
+    """Bulk-insert journaled rows into SQLite until the journal is drained. Must run in an app context.
+
+    Rows already stored (same timestamp, and trigger name for trigger rows) are skipped, so
+    replaying a batch twice (a crash between commit and checkpoint) does not duplicate them.
+    Returns the number of rows inserted.
+    """
+    inserted = 0
+    while True:
+        rows, offset = journal.read_pending(limit)
+        if not rows:
+            return inserted
+        journal.oldest_pending = datetime.fromisoformat(rows[0]['timestamp'])
+        by_table = {}
+        for row in rows:
+            # Lines written before trigger rows were journaled carry no table
+            by_table.setdefault(row.get('table', 'sensor_data'), []).append(row)
+        new = 0
+        try:
+            for table, table_rows in by_table.items():
+                new_rows = _new_rows(table, table_rows)
+                if new_rows:
+                    db.session.execute(insert(TABLES[table][0]), new_rows)
+                new += len(new_rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        journal.commit(offset, rows[-1]['seq'])
+        journal.replayed += new
+        journal.duplicates += len(rows) - new
+        inserted += new
+        if len(rows) < limit:
+            return inserted
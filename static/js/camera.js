@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const captureBtn = document.getElementById('captureBtn');
     const captureSpinner = document.getElementById('captureSpinner');
     const autoRefreshBtn = document.getElementById('autoRefreshBtn');
+    const liveBtn = document.getElementById('liveBtn');
     const gallerySlider = document.getElementById('gallerySlider');
     const emptyGallery = document.getElementById('emptyGallery');
     const galleryContent = document.getElementById('galleryContent');
@@ -53,8 +54,10 @@ document.addEventListener('DOMContentLoaded', function() {
                     noCamera.style.display = 'block';
                     cameraImage.style.display = 'none';
                 } else {
-                    // Display the captured image
-                    displayLatestImage();
+                    // Display the captured image (unless the live view is showing)
+                    if (liveBtn.dataset.live !== 'true') {
+                        displayLatestImage();
+                    }
                     // Reload gallery
                     loadGallery();
                 }
@@ -297,6 +300,35 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Live view toggle: the browser renders the MJPEG stream directly in the <img>
+    liveBtn.addEventListener('click', () => {
+        const isLive = liveBtn.dataset.live === 'true';
+
+        if (isLive) {
+            // Clearing the src closes the stream, so the server can release the webcam
+            cameraImage.src = '';
+            liveBtn.classList.remove('btn-secondary');
+            liveBtn.classList.add('btn-outline-secondary');
+            liveBtn.textContent = 'Start Live View';
+            liveBtn.dataset.live = 'false';
+            displayLatestImage();
+        } else {
+            liveBtn.classList.remove('btn-outline-secondary');
+            liveBtn.classList.add('btn-secondary');
+            liveBtn.textContent = 'Stop Live View';
+            liveBtn.dataset.live = 'true';
+            cameraImage.onerror = () => {
+                if (liveBtn.dataset.live === 'true') {
+                    showError('Live view unavailable');
+                    liveBtn.click();
+                }
+            };
+            cameraImage.src = `/camera/live?t=${Date.now()}`;
+            cameraImage.style.display = 'block';
+            noCamera.style.display = 'none';
+        }
+    });
+
     // Show error message
     function showError(message) {
         console.error(message);
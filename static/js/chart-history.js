@@ -206,6 +206,43 @@ function selectDay(year, month, day) {
     loadDayData(year, month, day);
 }
 
+// Expand a columnar /api/history payload into one row per minute that has sensor data.
+// Trigger states are run-length encoded as [minuteIndex, active] transitions, so carry each forward.
+function rowsFromColumnar(data) {
+    const rows = [];
+    if (!data.start) return rows;
+    const startMs = new Date(data.start).getTime();
+    const triggerNames = Object.keys(data.triggers);
+    const cursors = triggerNames.map(() => 0);
+    const states = triggerNames.map(() => null);
+    for (let i = 0; i < data.count; i++) {
+        triggerNames.forEach((name, t) => {
+            const transitions = data.triggers[name];
+            while (cursors[t] < transitions.length && transitions[cursors[t]][0] <= i) {
+                states[t] = transitions[cursors[t]][1];
+                cursors[t]++;
+            }
+        });
+        // Minutes without sensor data are null; data_points only counts stored readings, so it can be 0
+        // for a minute filled in between compressed rows
+        if (data.fields.temp_f[i] === null) continue;
+        const triggers = {};
+        triggerNames.forEach((name, t) => {
+            if (states[t] !== null) triggers[name] = states[t];
+        });
+        rows.push({
+            time: new Date(startMs + i * data.step * 1000),
+            temp_f: data.fields.temp_f[i],
+            humidity: data.fields.humidity[i],
+            hydrometer_a: data.fields.hydrometer_a[i],
+            hydrometer_b: data.fields.hydrometer_b[i],
+            fan_signal: data.fields.fan_signal[i],
+            triggers: triggers
+        });
+    }
+    return rows;
+}
+
 // Load data for a specific day
 async function loadDayData(year, month, day) {
     try {
@@ -221,7 +258,7 @@ async function loadDayData(year, month, day) {
         const start = new Date(startLocal.getTime() - offsetMs).toISOString();
         const end = new Date(endLocal.getTime() - offsetMs).toISOString();
         
-        const response = await fetch(`/api/history?start=${start}&end=${end}`);
+        const response = await fetch(`/api/history?start=${start}&end=${end}&format=columnar`);
         
         if (!response.ok) {
             const errorText = await response.text();
@@ -230,28 +267,24 @@ async function loadDayData(year, month, day) {
         }
         
         const data = await response.json();
-        
-        // Handle both old and new API response formats
-        const sensorData = data.sensor_data || data;
-        const triggerLogs = data.trigger_logs || {};
+        const sensorData = rowsFromColumnar(data);
 
         // Store full day data for filtering
         window.fullDaySensorData = sensorData;
-        window.fullDayTriggerLogs = triggerLogs;
+        window.fullDayTriggerNames = Object.keys(data.triggers || {});
 
         window.filterChartByHour = function() {
             if (!window.fullDaySensorData.length) return;
             const startHour = parseInt(hourRangeStart.value);
             const endHour = parseInt(hourRangeEnd.value);
             const filtered = window.fullDaySensorData.filter(d => {
-                const date = new Date(d.timestamp);
-                const hour = date.getHours();
+                const hour = d.time.getHours();
                 return hour >= startHour && hour < endHour;
             });
             // Update chart labels and datasets
             if (chart) {
                 chart.data.labels = filtered.map(d => {
-                    const time = new Date(d.timestamp).toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
+                    const time = d.time.toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
                     return time;
                 });
                 chart.data.datasets[0].data = filtered.map(d => d.temp_f);
@@ -260,16 +293,11 @@ async function loadDayData(year, month, day) {
                 chart.data.datasets[3].data = filtered.map(d => d.hydrometer_b);
                 chart.data.datasets[4].data = filtered.map(d => d.fan_signal);
                 // Triggers
-                const triggerNames = new Set();
-                Object.values(window.fullDayTriggerLogs).forEach(tsTriggers => {
-                    Object.keys(tsTriggers).forEach(name => triggerNames.add(name));
-                });
                 while (chart.data.datasets.length > 5) chart.data.datasets.pop();
-                Array.from(triggerNames).forEach((triggerName, idx) => {
+                window.fullDayTriggerNames.forEach((triggerName, idx) => {
                     const triggerData = filtered.map(d => {
-                        const logEntry = window.fullDayTriggerLogs[d.timestamp];
-                        if (logEntry && triggerName in logEntry) {
-                            return logEntry[triggerName] ? 100 : 0;
+                        if (triggerName in d.triggers) {
+                            return d.triggers[triggerName] ? 100 : 0;
                         }
                         return null;
                     });
@@ -129,8 +129,15 @@ function initChart() {
     console.log('Chart initialized successfully');
 }
 
-function updateLiveChart(data) {
-    if (!liveChart) return;
+// Cursor returned by /api/data?since=, so each poll only transfers readings the chart has not seen
+let liveCursor = null;
+let liveFetchInFlight = false;
+// Timestamp of the newest point drawn; 'latest' may be drawn before the stored rows around it arrive
+let lastLiveTimestamp = null;
+
+function addLivePoint(data) {
+    if (lastLiveTimestamp && data.timestamp <= lastLiveTimestamp) return;
+    lastLiveTimestamp = data.timestamp;
     const time = new Date(data.timestamp).toLocaleTimeString();
     chartData.labels.push(time);
     chartData.temps.push(parseFloat(data.temp_f) || 0);
@@ -151,6 +158,9 @@ function updateLiveChart(data) {
         chartData.hydrometer_b.shift();
         chartData.water_valve.shift();
     }
+}
+
+function redrawLiveChart() {
     liveChart.data.labels = chartData.labels;
     liveChart.data.datasets[0].data = chartData.temps;
     liveChart.data.datasets[1].data = chartData.humidities;
@@ -162,7 +172,10 @@ function updateLiveChart(data) {
 }
 
 function fetchLiveData() {
-    fetch('/api/data')
+    if (liveFetchInFlight) return;  // Overlapping polls would add the same readings twice
+    liveFetchInFlight = true;
+    const url = liveCursor ? '/api/data?since=' + encodeURIComponent(liveCursor) : '/api/data';
+    fetch(url)
         .then(response => {
             if (!response.ok) {
                 throw new Error('API error: ' + response.status);
@@ -170,11 +183,26 @@ function fetchLiveData() {
             return response.json();
         })
         .then(data => {
-            if (data && data.timestamp) {
-                updateLiveChart(data);
+            liveFetchInFlight = false;
+            if (!liveChart) return;
+            if (!liveCursor) {
+                // First poll: start from the latest reading, then ask only for newer ones
+                if (data && data.timestamp) {
+                    addLivePoint(data);
+                    redrawLiveChart();
+                    liveCursor = data.timestamp;
+                }
+                return;
             }
+            const drawn = lastLiveTimestamp;
+            data.readings.forEach(addLivePoint);
+            if (data.latest && data.latest.timestamp) addLivePoint(data.latest);
+            if (lastLiveTimestamp !== drawn) redrawLiveChart();
+            liveCursor = data.cursor;
+            if (data.more) fetchLiveData();  // Still catching up (e.g. tab was in the background)
         })
         .catch(error => {
+            liveFetchInFlight = false;
             console.error('Error fetching data:', error);
         });
 }
@@ -1,68 +1,71 @@
 document.addEventListener('DOMContentLoaded', function() {
-    function updateData() {
-        fetch('/api/data')
+    // One snapshot (/api/dashboard) feeds every card; unchanged snapshots come back as 304
+    function updateDashboard() {
+        fetch('/api/dashboard')
             .then(response => response.json())
-            .then(data => {
-                document.getElementById('temp').textContent     = (typeof data.temp_f    === 'number') ? data.temp_f.toFixed(1)    : '--';
+            .then(snapshot => {
+                showData(snapshot.data);
+                showDbInfo(snapshot.db_info);
+                showLatestImage(snapshot.camera);
+                showWateringSchedule((snapshot.watering || []).find(zone => zone.zone_id === 1));
+                showTriggers(snapshot.triggers || []);
+            })
+            .catch(() => showLatestImage(null));
+    }
+
+    function showData(data) {
+        data = data || {};
+        document.getElementById('temp').textContent     = (typeof data.temp_f    === 'number') ? data.temp_f.toFixed(1)    : '--';
                 document.getElementById('humidity').textContent = (typeof data.humidity   === 'number') ? data.humidity.toFixed(1)  : '--';
                 document.getElementById('hyd_a').textContent    = (typeof data.hydrometer_a === 'number') ? Math.round(data.hydrometer_a) : (data.hydrometer_a || '--');
                 document.getElementById('hyd_b').textContent    = (typeof data.hydrometer_b === 'number') ? Math.round(data.hydrometer_b) : (data.hydrometer_b || '--');
-                document.getElementById('fan').textContent      = (typeof data.fan_signal === 'number') ? Math.round(data.fan_signal) : (data.fan_signal || '--');
-            });
+        document.getElementById('fan').textContent      = (typeof data.fan_signal === 'number') ? Math.round(data.fan_signal) : (data.fan_signal || '--');
     }
 
-    function updateDbInfo() {
-        fetch('/api/db_info')
-            .then(response => response.json())
-            .then(data => {
-                document.getElementById('record-count').textContent = data.record_count || '--';
-                let sizeMB = data.db_size ? (data.db_size / (1024 * 1024)).toFixed(2) + ' MB' : '--';
-                document.getElementById('db-size').textContent = sizeMB;
-            });
+    function showDbInfo(data) {
+        data = data || {};
+        document.getElementById('record-count').textContent = data.record_count || '--';
+        let sizeMB = data.db_size ? (data.db_size / (1024 * 1024)).toFixed(2) + ' MB' : '--';
+        document.getElementById('db-size').textContent = sizeMB;
     }
 
-    function updateLatestImage() {
-        fetch('/api/camera/latest')
-            .then(response => response.json())
-            .then(data => {
-                const imgEl = document.getElementById('latest-image');
-                const infoEl = document.getElementById('latest-image-info');
-                if (data && data.filename) {
-                    imgEl.src = `/camera/images/${data.filename}`;
-                    infoEl.textContent = `Captured: ${new Date(data.timestamp).toLocaleString()} | Size: ${(data.size/1024).toFixed(1)} KB`;
-                } else {
-                    imgEl.src = '';
-                    infoEl.textContent = 'No image available.';
-                }
-            })
-            .catch(() => {
-                const imgEl = document.getElementById('latest-image');
-                const infoEl = document.getElementById('latest-image-info');
-                imgEl.src = '';
-                infoEl.textContent = 'No image available.';
-            });
+    function showLatestImage(data) {
+        const imgEl = document.getElementById('latest-image');
+        const infoEl = document.getElementById('latest-image-info');
+        if (data && data.filename) {
+            const src = `/camera/images/${data.filename}`;
+            if (imgEl.getAttribute('src') !== src) imgEl.src = src;
+            infoEl.textContent = `Captured: ${new Date(data.timestamp).toLocaleString()} | Size: ${(data.size/1024).toFixed(1)} KB`;
+        } else {
+            imgEl.src = '';
+            infoEl.textContent = 'No image available.';
+        }
+    }
+
+    function showTriggers(triggers) {
+        const pills = triggers.map(trigger => {
+            const pillClass = trigger.active ? 'bg-success text-white' : 'bg-secondary text-white';
+            return `<span class="badge rounded-pill ${pillClass}" title="${trigger.name}">${trigger.name}</span>`;
+        }).join(' ');
+        document.getElementById('trigger-pills').innerHTML = pills;
     }
 
     // --- Next watering countdown ---
     let nextWaterMs = null;
     let scheduleEnabled = true;
 
-    function loadWateringSchedule() {
-        fetch('/api/watering/schedule')
-            .then(r => r.json())
-            .then(data => {
-                scheduleEnabled = data.enabled;
-                if (!scheduleEnabled) {
-                    nextWaterMs = null;
-                    return;
-                }
-                if (data.last_watered) {
-                    nextWaterMs = new Date(data.last_watered).getTime() + data.interval_hours * 3600 * 1000;
-                } else {
-                    nextWaterMs = null;
-                }
-            })
-            .catch(() => {});
+    function showWateringSchedule(data) {
+        if (!data) return;
+        scheduleEnabled = data.enabled;
+        if (!scheduleEnabled) {
+            nextWaterMs = null;
+            return;
+        }
+        if (data.last_watered) {
+            nextWaterMs = new Date(data.last_watered).getTime() + data.interval_hours * 3600 * 1000;
+        } else {
+            nextWaterMs = null;
+        }
     }
 
     function updateWateringCountdown() {
@@ -82,17 +85,9 @@ document.addEventListener('DOMContentLoaded', function() {
         el.textContent = (h > 0 ? h + 'h ' : '') + (h > 0 || m > 0 ? m + 'm ' : '') + s + 's';
     }
 
-    loadWateringSchedule();
-    setInterval(loadWateringSchedule, 60000);
     setInterval(updateWateringCountdown, 1000);
     // ---
 
-    setInterval(updateData, 1000);
-    updateData();
-
-    setInterval(updateDbInfo, 10000);  // Update every 10 seconds
-    updateDbInfo();
-
-    setInterval(updateLatestImage, 10000); // Update image every 10 seconds
-    updateLatestImage();
+    setInterval(updateDashboard, 1000);
+    updateDashboard();
 });
\ No newline at end of file
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from compression import ReadingCompressor, reconstruct
+
+FIELDS = ('temp_f', 'humidity')
+TOLERANCES = {'temp_f': 0.2, 'humidity': 0.5}
+
+
+def _readings(count, seed):
+    rng = np.random.default_rng(seed)
+    start = datetime(2026, 1, 1)
+    temp = 70 + np.cumsum(rng.normal(0, 0.15, count))
+    humidity = 50 + np.cumsum(rng.normal(0, 0.3, count))
+    # Every 10 s, on the reconstruction grid, so each reading has a reconstructed point to compare with
+    return [{'timestamp': start + timedelta(seconds=10 * i), 'temp_f': float(temp[i]),
+             'humidity': float(humidity[i])} for i in range(count)]
+
+
+def test_swinging_door_reconstruction_stays_within_tolerance():
+    for seed in range(5):
+        readings = _readings(2000, seed)
+        compressor = ReadingCompressor('swinging_door', TOLERANCES, max_interval=300)
+        stored = [row for reading in readings for row in compressor.offer(reading)] + compressor.flush()
+        assert len(stored) < len(readings)
+        columns = {'timestamp': np.array([row['timestamp'] for row in stored], dtype='datetime64[us]')}
+        columns.update({field: np.array([row[field] for row in stored]) for field in FIELDS})
+        filled = reconstruct(columns, mode='swinging_door', max_gap=300)
+        assert len(filled['timestamp']) == len(readings)
+        for field in FIELDS:
+            original = np.array([reading[field] for reading in readings])
+            assert np.abs(filled[field] - original).max() <= TOLERANCES[field] + 1e-9
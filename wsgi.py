@@ -0,0 +1,19 @@
+"""
+wsgi.py - Entry point for the production web tier
+Serves the HTTP API only. Serial, camera and scheduling run in daemon.py, which must be
+started separately; hardware commands from the web workers are forwarded to it over IPC.
+
+Usage:
+  gunicorn -w 2 -k gthread --threads 16 -b 0.0.0.0:5000 wsgi:app   # Linux / Raspberry Pi
+  waitress-serve --threads 16 --port 5000 wsgi:app                 # Windows or anywhere
+"""
+
+import os
+
+os.environ.setdefault('AUTO_FARM_ROLE', 'web')
+
+from app import create_app, log_startup_timings  # noqa: E402
+
+# The WSGI server's own command line is not ours to parse
+app = create_app(argv=[])
+log_startup_timings()